@@ -0,0 +1,36 @@
+from pymongo import AsyncMongoClient
+from pymongo.asynchronous.database import AsyncDatabase
+
+from typing import Optional
+
+from settings import Settings
+
+# Same fallback as mongoengine when the url has no database
+DEFAULT_DATABASE_NAME = "test"
+
+__client: Optional[AsyncMongoClient] = None
+
+
+def connect(settings: Settings) -> AsyncMongoClient:
+    """Create the connection pool shared by all repositories"""
+    global __client
+
+    __client = AsyncMongoClient(
+        settings.mongo_url.get_secret_value(), maxPoolSize=settings.mongo_pool_size
+    )
+    return __client
+
+
+def get_database() -> AsyncDatabase:
+    if __client is None:
+        raise RuntimeError("MongoDB connection is not established")
+
+    return __client.get_default_database(DEFAULT_DATABASE_NAME)
+
+
+async def close():
+    global __client
+
+    if __client is not None:
+        await __client.close()
+        __client = None
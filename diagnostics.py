@@ -0,0 +1,221 @@
+import io
+import sys
+import time
+import types
+import logging
+import functools
+import threading
+import traceback
+
+import asyncio
+from collections import Counter, deque
+
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+from telegram import Update
+from telegram.ext import Application, CommandHandler, ContextTypes, filters
+
+from settings import Settings
+
+logger = logging.getLogger(__name__)
+
+MAX_PROFILE_SECONDS = 60
+PROFILE_INTERVAL = 0.005
+PROFILE_TOP = 30
+
+
+class HandlerStats(object):
+    def __init__(self):
+        self.calls = 0
+        self.wall = 0.0
+        self.blocked = 0.0
+        self.max_wall = 0.0
+        self.max_blocked = 0.0
+
+    def record(self, wall: float, blocked: float):
+        self.calls += 1
+        self.wall += wall
+        self.blocked += blocked
+        self.max_wall = max(self.max_wall, wall)
+        self.max_blocked = max(self.max_blocked, blocked)
+
+
+class LoopMonitor(object):
+    """Detects event loop stalls and traces how long handlers block the loop.
+
+    A heartbeat task on the loop stamps the time every tick and a watchdog thread
+    checks the stamp. When the loop doesn't come back in time the watchdog grabs
+    the stack the loop thread is stuck in.
+    """
+
+    def __init__(self, settings: Settings):
+        self.threshold = settings.stall_threshold
+        self.tick = self.threshold / 4
+        self.stats: Dict[str, HandlerStats] = {}
+        self.stalls: Deque[Tuple[float, float, str]] = deque(maxlen=20)
+        self._beat = time.perf_counter()
+        self._loop_thread: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stop = threading.Event()
+        self._watchdog: Optional[threading.Thread] = None
+
+    async def start(self):
+        self._loop_thread = threading.get_ident()
+        self._beat = time.perf_counter()
+        self._task = asyncio.create_task(self._heartbeat())
+        self._watchdog = threading.Thread(
+            target=self._watch, name="loop-watchdog", daemon=True
+        )
+        self._watchdog.start()
+
+    async def stop(self):
+        self._stop.set()
+        if self._task is not None:
+            self._task.cancel()
+
+    def instrument(self, application: Application):
+        """Wrap every registered handler callback with tracing"""
+        for handlers in application.handlers.values():
+            for handler in handlers:
+                callback = handler.callback
+                name = f"{callback.__module__}.{callback.__qualname__}"
+                handler.callback = self.traced(name, callback)
+
+    def traced(self, name: str, callback: Callable[..., Any]) -> Callable[..., Any]:
+        @functools.wraps(callback)
+        async def wrapper(*args, **kwargs):
+            blocked = [0.0]
+            start = time.perf_counter()
+            try:
+                return await _measure(callback(*args, **kwargs), blocked)
+            finally:
+                wall = time.perf_counter() - start
+                self.stats.setdefault(name, HandlerStats()).record(wall, blocked[0])
+                if blocked[0] > self.threshold:
+                    logger.warning(
+                        "Handler %s blocked the loop for %.3fs of %.3fs",
+                        name,
+                        blocked[0],
+                        wall,
+                    )
+
+        return wrapper
+
+    def profile(self, seconds: float) -> str:
+        """Sample the loop thread stack and return the hottest stacks.
+
+        Blocks the calling thread, run it with asyncio.to_thread.
+        """
+        samples: Counter = Counter()
+        total = 0
+        deadline = time.perf_counter() + seconds
+
+        while time.perf_counter() < deadline:
+            frame = sys._current_frames().get(self._loop_thread)  # type: ignore
+            if frame is not None:
+                stack = traceback.extract_stack(frame)
+                samples[
+                    ";".join(f"{f.name} ({f.filename}:{f.lineno})" for f in stack)
+                ] += 1
+                total += 1
+            time.sleep(PROFILE_INTERVAL)
+
+        lines = [f"{total} samples in {seconds}s"]
+        for stack, count in samples.most_common(PROFILE_TOP):
+            lines.append(f"{count / total * 100:6.2f}% {stack}")
+
+        return "\n".join(lines)
+
+    def report(self) -> str:
+        lines = ["handler calls avg_wall avg_blocked max_wall max_blocked"]
+        for name, s in sorted(
+            self.stats.items(), key=lambda item: item[1].blocked, reverse=True
+        ):
+            lines.append(
+                f"{name} {s.calls} {s.wall / s.calls:.3f} {s.blocked / s.calls:.3f} "
+                f"{s.max_wall:.3f} {s.max_blocked:.3f}"
+            )
+
+        lines.append(f"\nStalls over {self.threshold}s: {len(self.stalls)}")
+        for at, duration, stack in self.stalls:
+            lines.append(f"{time.ctime(at)} {duration:.3f}s\n{stack}")
+
+        return "\n".join(lines)
+
+    async def _heartbeat(self):
+        while True:
+            self._beat = time.perf_counter()
+            await asyncio.sleep(self.tick)
+
+    def _watch(self):
+        reported = None
+        while not self._stop.wait(self.tick):
+            beat = self._beat
+            lag = time.perf_counter() - beat - self.tick
+            if lag <= self.threshold or beat == reported:
+                continue
+
+            # Report every stall once, with the stack it is stuck in
+            reported = beat
+            frame = sys._current_frames().get(self._loop_thread)  # type: ignore
+            stack = "".join(traceback.format_stack(frame)) if frame else ""
+            self.stalls.append((time.time(), lag, stack))
+            logger.warning("Event loop is blocked for %.3fs at:\n%s", lag, stack)
+
+
+@types.coroutine
+def _measure(coro, blocked: List[float]):
+    """Drive `coro` and add the time spent in its synchronous steps to `blocked`"""
+    send, value = coro.send, None
+    while True:
+        start = time.perf_counter()
+        try:
+            future = send(value)
+        except StopIteration as e:
+            return e.value
+        finally:
+            blocked[0] += time.perf_counter() - start
+
+        try:
+            value = yield future
+            send = coro.send
+        except GeneratorExit:
+            coro.close()
+            raise
+        except BaseException as e:
+            value = e
+            send = coro.throw
+
+
+def register_handlers(
+    application: Application, monitor: LoopMonitor, admin_ids: List[int]
+):
+    admins = filters.User(user_id=admin_ids)
+
+    async def diagnostics(update: Update, context: ContextTypes.DEFAULT_TYPE):
+        assert update.effective_message is not None
+
+        await update.effective_message.reply_document(
+            io.BytesIO(monitor.report().encode("utf-8")), filename="diagnostics.txt"
+        )
+
+    async def profile(update: Update, context: ContextTypes.DEFAULT_TYPE):
+        assert update.effective_message is not None
+
+        try:
+            seconds = float(context.args[0]) if context.args else 10.0
+            seconds = min(max(seconds, 0.0), MAX_PROFILE_SECONDS)
+        except ValueError:
+            await update.effective_message.reply_text("Usage: /profile [seconds]")
+            return
+
+        await update.effective_message.reply_text(f"Профилирую {seconds} с")
+        report = await asyncio.to_thread(monitor.profile, seconds)
+        await update.effective_message.reply_document(
+            io.BytesIO(report.encode("utf-8")), filename="profile.txt"
+        )
+
+    application.add_handler(
+        CommandHandler("diagnostics", diagnostics, filters=admins)
+    )
+    application.add_handler(CommandHandler("profile", profile, filters=admins))
@@ -0,0 +1,199 @@
+import json
+import time
+import logging
+
+import asyncio
+from deluge_client import DelugeRPCClient
+from datetime import datetime, timezone
+
+from typing import Any, Dict, Optional
+
+from telegram.ext import Application
+from apscheduler.jobstores.base import BaseJobStore
+
+from db import get_database
+from settings import Settings
+
+logger = logging.getLogger(__name__)
+
+
+class HealthMonitor(object):
+    """Serves /healthz and /readyz from probe results cached by a background task.
+
+    Requests only read the cache, so health checks never touch MongoDB or Deluge
+    themselves.
+    """
+
+    def __init__(
+        self, application: Application, jobstore: BaseJobStore, settings: Settings
+    ):
+        self.application = application
+        self.jobstore = jobstore
+        self.settings = settings
+        self.probes: Dict[str, Dict[str, Any]] = {}
+        self.checked_at: Optional[float] = None
+        self._task: Optional[asyncio.Task] = None
+        self._server: Optional[asyncio.Server] = None
+
+    async def start(self):
+        self._task = asyncio.create_task(self._run())
+        self._server = await asyncio.start_server(
+            self._handle, self.settings.health_host, self.settings.health_port
+        )
+        logger.info(
+            "Health server listens on %s:%s",
+            self.settings.health_host,
+            self.settings.health_port,
+        )
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+
+        if self._task is not None:
+            self._task.cancel()
+
+    def alive(self) -> bool:
+        """The probe loop is running and the scheduler keeps up with its jobs"""
+        if self.checked_at is None:
+            return True
+
+        stale_after = 3 * self.settings.health_interval
+        if time.monotonic() - self.checked_at > stale_after:
+            return False
+
+        # A failed job store read makes the bot not ready, not dead
+        scheduler = self.probes.get("scheduler", {})
+        return (
+            scheduler.get("running", True)
+            and scheduler.get("oldest_overdue_s", 0.0)
+            <= self.settings.health_overdue_grace
+        )
+
+    def ready(self) -> bool:
+        """Every dependency answered on the last probe"""
+        return self.checked_at is not None and all(
+            probe["ok"] for probe in self.probes.values()
+        )
+
+    async def probe(self):
+        mongo, deluge, scheduler = await asyncio.gather(
+            self._timed(self._probe_mongo),
+            self._timed(self._probe_deluge),
+            self._timed(self._probe_scheduler),
+        )
+        self.probes = {"mongo": mongo, "deluge": deluge, "scheduler": scheduler}
+        self.checked_at = time.monotonic()
+
+        for name, probe in self.probes.items():
+            if not probe["ok"]:
+                logger.warning("Health probe %s failed: %s", name, probe)
+
+    async def _run(self):
+        while True:
+            try:
+                await self.probe()
+            except Exception as e:
+                logger.error("Unable to run health probes: %s", e)
+
+            await asyncio.sleep(self.settings.health_interval)
+
+    async def _timed(self, probe) -> Dict[str, Any]:
+        start = time.perf_counter()
+        try:
+            # Blocking probes run in a worker thread
+            pending = (
+                probe()
+                if asyncio.iscoroutinefunction(probe)
+                else asyncio.to_thread(probe)
+            )
+            result = await asyncio.wait_for(
+                pending, timeout=self.settings.health_timeout
+            )
+        except Exception as e:
+            result = {"ok": False, "error": repr(e)}
+
+        result["latency_ms"] = round((time.perf_counter() - start) * 1000, 2)
+        return result
+
+    async def _probe_mongo(self) -> Dict[str, Any]:
+        await get_database().command("ping")
+        return {"ok": True}
+
+    def _probe_deluge(self) -> Dict[str, Any]:
+        with DelugeRPCClient(
+            self.settings.deluge_addr,
+            self.settings.deluge_port,
+            self.settings.deluge_username.get_secret_value(),
+            self.settings.deluge_password.get_secret_value(),
+            automatic_reconnect=False,
+            timeout=self.settings.health_timeout,
+        ) as client:
+            client.call("daemon.info")
+        return {"ok": True}
+
+    def _probe_scheduler(self) -> Dict[str, Any]:
+        assert self.application.job_queue is not None
+
+        running = self.application.job_queue.scheduler.running
+        try:
+            next_run_time = self.jobstore.get_next_run_time()
+        except Exception as e:
+            return {"ok": False, "running": running, "error": repr(e)}
+
+        overdue = 0.0
+        if next_run_time is not None:
+            overdue = max(
+                0.0, (datetime.now(timezone.utc) - next_run_time).total_seconds()
+            )
+
+        return {
+            "ok": running and overdue <= self.settings.health_overdue_grace,
+            "running": running,
+            "oldest_overdue_s": round(overdue, 2),
+        }
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            request_line = await asyncio.wait_for(reader.readline(), timeout=5)
+            _method, path, *_remains = request_line.decode("latin-1").split(" ")
+
+            if path == "/healthz":
+                ok = self.alive()
+            elif path == "/readyz":
+                ok = self.ready()
+            else:
+                await self._respond(writer, "404 Not Found", {"error": "not found"})
+                return
+
+            await self._respond(
+                writer,
+                "200 OK" if ok else "503 Service Unavailable",
+                self._report(ok),
+            )
+        except Exception as e:
+            logger.debug("Bad health request: %s", e)
+        finally:
+            writer.close()
+
+    def _report(self, ok: bool) -> Dict[str, Any]:
+        age = None if self.checked_at is None else time.monotonic() - self.checked_at
+        return {
+            "status": "ok" if ok else "fail",
+            "checked_s_ago": None if age is None else round(age, 2),
+            "probes": self.probes,
+        }
+
+    async def _respond(
+        self, writer: asyncio.StreamWriter, status: str, body: Dict[str, Any]
+    ):
+        payload = json.dumps(body).encode("utf-8")
+        writer.write(
+            f"HTTP/1.0 {status}\r\n"
+            f"Content-Type: application/json\r\n"
+            f"Content-Length: {len(payload)}\r\n"
+            f"Connection: close\r\n\r\n".encode("latin-1")
+            + payload
+        )
+        await writer.drain()
@@ -0,0 +1,166 @@
+import os
+import time
+import socket
+import logging
+
+import asyncio
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from typing import Any, Awaitable, Callable, Optional
+
+from telegram.ext import Application
+from apscheduler.schedulers.base import STATE_STOPPED
+
+from db import get_database
+from settings import Settings
+
+logger = logging.getLogger(__name__)
+
+LEASE_COLLECTION = "leases"
+SCHEDULER_LEASE = "scheduler"
+
+
+class LeaderElection(object):
+    """Elects the single replica that runs the job scheduler.
+
+    Replicas compete for a lease document in MongoDB. The holder renews it every
+    third of its ttl and the others take it over once it expires, so failover
+    takes at most `lease_ttl` plus one renew interval. Expiry is checked against
+    the MongoDB server clock, so clock skew between replicas doesn't matter.
+    The holder also counts the ttl from the start of its last successful renew
+    on its own monotonic clock and pauses the scheduler once that passes, before
+    anyone else can take the lease.
+
+    Every replica starts the scheduler paused and can add, pause and remove jobs
+    in the shared job store; only the leader resumes it and runs them.
+    """
+
+    def __init__(
+        self,
+        application: Application,
+        settings: Settings,
+        on_elected: Optional[Callable[[], Awaitable[Any]]] = None,
+    ):
+        assert application.job_queue is not None
+
+        self.scheduler = application.job_queue.scheduler
+        self.instance_id = (
+            settings.instance_id or f"{socket.gethostname()}:{os.getpid()}"
+        )
+        self.ttl = settings.lease_ttl
+        self.on_elected = on_elected
+        self.is_leader = False
+        self._task: Optional[asyncio.Task] = None
+        self._on_elected_task: Optional[asyncio.Task] = None
+        self._expiry: Optional[asyncio.TimerHandle] = None
+
+    async def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        for task in (self._task, self._on_elected_task):
+            if task is not None:
+                task.cancel()
+
+        if self.is_leader:
+            self._step_down()
+            try:
+                # Let another replica take over right away
+                await asyncio.wait_for(
+                    get_database()[LEASE_COLLECTION].delete_one(
+                        {"_id": SCHEDULER_LEASE, "holder": self.instance_id}
+                    ),
+                    timeout=self.ttl / 3,
+                )
+            except Exception as e:
+                logger.error("Unable to release scheduler lease: %s", e)
+
+    async def _run(self):
+        while True:
+            started = time.monotonic()
+            try:
+                # A renew slower than this leaves too little of the lease to trust
+                acquired = await asyncio.wait_for(
+                    self._acquire(), timeout=self.ttl / 3
+                )
+            except Exception as e:
+                # Keep the scheduler until the local deadline, see _hold_until
+                logger.error("Unable to renew scheduler lease: %r", e)
+                acquired = None
+
+            if acquired:
+                self._hold_until(started + self.ttl)
+                if not self.is_leader:
+                    self._elected()
+                else:
+                    # Pick up jobs added by other replicas since the last wakeup
+                    self.scheduler.wakeup()
+            elif acquired is False and self.is_leader:
+                self._step_down()
+
+            await asyncio.sleep(self.ttl / 3)
+
+    async def _acquire(self) -> bool:
+        now_plus_ttl = {"$add": ["$$NOW", int(self.ttl * 1000)]}
+        try:
+            await get_database()[LEASE_COLLECTION].find_one_and_update(
+                {
+                    "_id": SCHEDULER_LEASE,
+                    "$or": [
+                        {"holder": self.instance_id},
+                        {"$expr": {"$lt": ["$expires_at", "$$NOW"]}},
+                    ],
+                },
+                [{"$set": {"holder": self.instance_id, "expires_at": now_plus_ttl}}],
+                upsert=True,
+                return_document=ReturnDocument.AFTER,
+            )
+        except DuplicateKeyError:
+            # The lease exists and is held by another replica
+            return False
+
+        return True
+
+    def _elected(self):
+        logger.info("%s is the scheduler leader now", self.instance_id)
+        self.is_leader = True
+        self.scheduler.resume()
+
+        if self.on_elected is not None:
+            # Runs aside so a slow start up doesn't delay the next renew
+            self._on_elected_task = asyncio.create_task(self._run_on_elected())
+
+    async def _run_on_elected(self):
+        assert self.on_elected is not None
+
+        try:
+            await self.on_elected()
+        except Exception as e:
+            logger.error("Unable to run leader start up: %s", e)
+
+    def _hold_until(self, deadline: float):
+        """Step down at `deadline` unless a later renew moves it"""
+        if self._expiry is not None:
+            self._expiry.cancel()
+
+        self._expiry = asyncio.get_running_loop().call_later(
+            max(0.0, deadline - time.monotonic()), self._expire
+        )
+
+    def _expire(self):
+        self._expiry = None
+        if self.is_leader:
+            logger.warning("Scheduler lease of %s has expired", self.instance_id)
+            self._step_down()
+
+    def _step_down(self):
+        logger.warning("%s is not the scheduler leader anymore", self.instance_id)
+        self.is_leader = False
+        if self._expiry is not None:
+            self._expiry.cancel()
+            self._expiry = None
+
+        # Application.stop shuts the scheduler down before post_stop runs
+        if self.scheduler.state != STATE_STOPPED:
+            self.scheduler.pause()
@@ -0,0 +1,152 @@
+import sys
+import copy
+import json
+import queue
+import atexit
+import logging
+import threading
+import logging.handlers
+
+from datetime import datetime, timezone
+
+from typing import Dict, List, Tuple
+
+from settings import Settings
+
+TRACE = 5
+
+TEXT_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+
+# LogRecord attributes, everything else on a record came with `extra=`
+_RECORD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {
+    "message",
+    "asctime",
+    "taskName",
+}
+
+
+class JsonFormatter(logging.Formatter):
+    """Formats a record as a single line JSON object with its `extra` fields"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        payload = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(
+                timespec="milliseconds"
+            ),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "module": record.module,
+            "line": record.lineno,
+            "thread": record.threadName,
+        }
+
+        if record.exc_info:
+            payload["exc_info"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            payload["exc_info"] = record.exc_text
+        if record.stack_info:
+            payload["stack_info"] = self.formatStack(record.stack_info)
+
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRS and not key.startswith("_"):
+                payload[key] = value
+
+        return json.dumps(payload, default=str, ensure_ascii=False)
+
+
+class SamplingFilter(logging.Filter):
+    """Lets through at most `rate` records per message template every `window` seconds.
+
+    Applies to records below WARNING from the given loggers and their children.
+    The first record let through in a new window carries the number of records
+    dropped in the previous one as `sampled_out`.
+    """
+
+    def __init__(self, loggers: List[str], rate: int, window: float):
+        super().__init__()
+        self.prefixes = tuple(loggers)
+        self.rate = rate
+        self.window = window
+        self._counts: Dict[Tuple[str, str], Tuple[float, int, int]] = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING or not self._sampled(record.name):
+            return True
+
+        # The template, not the formatted message, identifies repetitive records
+        key = (record.name, str(record.msg))
+        with self._lock:
+            started, passed, dropped = self._counts.get(key, (record.created, 0, 0))
+            if record.created - started >= self.window:
+                if dropped:
+                    record.sampled_out = dropped
+                started, passed, dropped = record.created, 0, 0
+
+            allowed = passed < self.rate
+            if allowed:
+                passed += 1
+            else:
+                dropped += 1
+
+            self._counts[key] = (started, passed, dropped)
+
+        return allowed
+
+    def _sampled(self, name: str) -> bool:
+        return any(name == p or name.startswith(f"{p}.") for p in self.prefixes)
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Merge the arguments now, they may change before the listener gets to
+        # them, but leave the rest of the formatting to the listener thread
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        if record.exc_info and not record.exc_text:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+
+        record.msg = record.message
+        record.args = None
+        record.exc_info = None
+        return record
+
+
+def setup_logging(settings: Settings) -> logging.handlers.QueueListener:
+    """Route all records through a queue to a stream handler in a listener thread.
+
+    Callers only pay for the level check, sampling and merging the arguments.
+    Formatting and writing happen in the listener thread, which is stopped and
+    drained at exit.
+    """
+    logging.addLevelName(TRACE, "TRACE")
+
+    stream = logging.StreamHandler(sys.stderr)
+    if settings.log_format == "json":
+        stream.setFormatter(JsonFormatter())
+    else:
+        stream.setFormatter(logging.Formatter(TEXT_FORMAT))
+
+    records: queue.SimpleQueue = queue.SimpleQueue()
+    handler = _QueueHandler(records)
+    handler.addFilter(
+        SamplingFilter(
+            settings.log_sampled, settings.log_sample_rate, settings.log_sample_window
+        )
+    )
+
+    root = logging.getLogger()
+    for existing in root.handlers[:]:
+        root.removeHandler(existing)
+    root.addHandler(handler)
+    root.setLevel(settings.log_level.upper())
+
+    for name, level in settings.log_levels.items():
+        logging.getLogger(name).setLevel(level.upper())
+
+    listener = logging.handlers.QueueListener(records, stream)
+    listener.start()
+    atexit.register(listener.stop)
+
+    return listener
@@ -1,5 +1,8 @@
 import logging
 
+import asyncio
+from typing import Set
+
 from telegram.ext import Application
 
 from apscheduler.events import (
@@ -17,46 +20,76 @@ from apscheduler.events import (
     EVENT_JOB_SUBMITTED,
 )
 
-from .model import Event, EventStatus
+from log import TRACE
+
+from . import repository as events
+from .model import EventStatus
+
+logger = logging.getLogger(__name__)
 
 UNABLE_CREATE_EVENT_MSG = "Unable to create event"
 UNABLE_PARSE_EVENT_ID_MSG = "Unable to parse event id"
+UNABLE_PARSE_DATE_MSG = "Unable to parse date"
 UNABLE_RESUME_EVENT_MSG = "Unable to resume event"
 UNABLE_PAUSE_EVENT_MSG = "Unable to pause event"
 UNABLE_DELETE_EVENT_MSG = "Unable to delete event"
 UNABLE_SCHEDULE_REMINDER_MSG = "Unable to schedule reminder"
+UNABLE_CONFIRM_EVENT_MSG = "Unable to confirm event"
+UNKNOWN_EVENT_MSG = "Unknown event"
+NOTHING_TO_CONFIRM_MSG = "Nothing to confirm"
+
+
+# Strong references to the pending listener writes, see asyncio.create_task
+__pending_writes: Set[asyncio.Task] = set()
+
+
+def __update_status(job_id: str, status: EventStatus):
+    # Listeners are called synchronously from the scheduler on the event loop,
+    # so the write is handed over to the loop instead of blocking it
+    task = asyncio.get_running_loop().create_task(
+        events.update_one(
+            {"job_id": job_id, "status__ne": EventStatus.DELETED}, status=status
+        )
+    )
+    __pending_writes.add(task)
+    task.add_done_callback(__pending_writes.discard)
 
 
 def generic_listener(event):
-    logging.log(5, "Generic event: ", event)
+    if not logger.isEnabledFor(TRACE):
+        return
+
+    logger.log(TRACE, "Generic event: %s", event)
     if isinstance(event, SchedulerEvent):
-        logging.log(5, "alias: ", event.alias)
+        logger.log(TRACE, "alias: %s", event.alias)
     if isinstance(event, JobEvent):
-        logging.log(5, "code: ", event.code)
-        logging.log(5, "job_id: ", event.job_id)
-        logging.log(5, "jobstore: ", event.jobstore)
+        logger.log(TRACE, "code: %s", event.code)
+        logger.log(TRACE, "job_id: %s", event.job_id)
+        logger.log(TRACE, "jobstore: %s", event.jobstore)
     if isinstance(event, JobSubmissionEvent):
-        logging.log(5, "scheduled_run_times: ", event.scheduled_run_times)
+        logger.log(TRACE, "scheduled_run_times: %s", event.scheduled_run_times)
     if isinstance(event, JobExecutionEvent):
-        logging.log(5, "retval: ", event.retval)
-        logging.log(5, "exception: ", event.exception)
-        logging.log(5, "traceback: ", event.traceback)
+        logger.log(TRACE, "retval: %s", event.retval)
+        logger.log(TRACE, "exception: %s", event.exception)
+        logger.log(TRACE, "traceback: %s", event.traceback)
 
 
 def register_job(event: JobEvent):
     if not isinstance(event, JobEvent):
         raise TypeError("Incorrect event type")
 
-    Event.objects(job_id=event.job_id).update_one(status=EventStatus.SCHEDULED)  # type: ignore
+    __update_status(event.job_id, EventStatus.SCHEDULED)
 
-    logging.debug(f"Event for {event.job_id} was scheduled")
+    logger.debug(
+        "Event for %s was scheduled", event.job_id, extra={"job_id": event.job_id}
+    )
 
 
 def schedule_job(event: JobSubmissionEvent):
     if not isinstance(event, JobSubmissionEvent):
         raise TypeError("Incorrect event type")
 
-    logging.debug(f"SCHEDULE {event.job_id}")
+    logger.debug("SCHEDULE %s", event.job_id, extra={"job_id": event.job_id})
 
 
 def miss_job(event: JobExecutionEvent):
@@ -64,7 +97,7 @@ def miss_job(event: JobExecutionEvent):
         raise TypeError("Incorrect event type")
 
 
-    logging.debug(f"MISS {event.job_id}")
+    logger.debug("MISS %s", event.job_id, extra={"job_id": event.job_id})
 
 
 def execute_job(event: JobExecutionEvent):
@@ -72,28 +105,30 @@ def execute_job(event: JobExecutionEvent):
         raise TypeError("Incorrect event type")
 
 
-    logging.debug(f"EXECUTE {event.job_id}")
+    logger.debug("EXECUTE %s", event.job_id, extra={"job_id": event.job_id})
 
 
 def fail_job(event: JobExecutionEvent):
     if not isinstance(event, JobExecutionEvent):
         raise TypeError("Incorrect event type")
 
-    logging.debug(f"FAIL {event.job_id}")
+    logger.debug("FAIL %s", event.job_id, extra={"job_id": event.job_id})
 
 
 def remove_job(event: JobExecutionEvent):
     if not isinstance(event, JobEvent):
         raise TypeError("Incorrect event type")
 
-    Event.objects(job_id=event.job_id).update_one(status=EventStatus.EXPIRED)  # type: ignore
+    __update_status(event.job_id, EventStatus.EXPIRED)
 
-    logging.debug(f"Event for {event.job_id} was expired")
+    logger.debug(
+        "Event for %s was expired", event.job_id, extra={"job_id": event.job_id}
+    )
 
 
 def subscribe_to_events(application: Application):
     if application.job_queue is None:
-        logging.error("Job queue doesn't exist")
+        logger.error("Job queue doesn't exist")
         return
 
     application.job_queue.scheduler.add_listener(register_job, EVENT_JOB_ADDED)
@@ -0,0 +1,172 @@
+import logging
+
+from datetime import datetime
+
+from typing import Optional, Tuple
+
+from telegram import Update
+from telegram.ext import ContextTypes, Application, CommandHandler
+
+from reminder.model import EventType
+from reminder.dateparse import (
+    DateParseError,
+    parse_date,
+    parse_datetime,
+    parse_interval,
+)
+from reminder.scheduling import (
+    DEFAULT_HOUR,
+    DEFAULT_ZONE,
+    SchedulingError,
+    confirm_event,
+    create_event,
+    delete_event,
+    describe,
+    get_user,
+    list_events,
+    make_idempotency_key,
+    parse_event_id,
+)
+from reminder import UNABLE_PARSE_DATE_MSG
+
+logger = logging.getLogger(__name__)
+
+__until_words = ("до", "until")
+__confirmation_flag = "!"
+
+
+def register_handlers(application: Application):
+    remind_handler = CommandHandler("remind", remind)
+    list_handler = CommandHandler("list_reminders", list)
+    cancel_handler = CommandHandler("cancel_reminder", cancel)
+    confirm_handler = CommandHandler("confirm_reminder", confirm)
+
+    application.add_handler(remind_handler)
+    application.add_handler(list_handler)
+    application.add_handler(cancel_handler)
+    application.add_handler(confirm_handler)
+
+
+async def remind(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """/remind <date> [[в] HH:MM] [каждые N <unit>] [до <date>] [!] <text>
+
+    The `!` flag repeats the reminder until it is confirmed with /confirm_reminder
+    """
+    assert update.effective_user is not None
+    assert update.effective_message is not None
+    assert context.job_queue is not None
+    assert update.effective_message.text is not None
+
+    now = datetime.now(tz=DEFAULT_ZONE)
+    _cmd, _sep, args = update.effective_message.text.partition(" ")
+
+    try:
+        date, interval, until, need_confirmation, text = __parse(args, now)
+    except DateParseError as e:
+        logger.error("Unable to parse reminder: %s", e)
+        await update.effective_message.reply_text(f"{UNABLE_PARSE_DATE_MSG}: {e}")
+        return
+
+    try:
+        user = await get_user(update.effective_user.id)
+        event = await create_event(
+            context.job_queue,
+            user,
+            update.effective_message.chat_id,
+            text,
+            EventType.CUSTOM,
+            date,
+            interval=interval,
+            until=until,
+            need_confirmation=need_confirmation,
+            idempotency_key=make_idempotency_key(update.update_id),
+        )
+    except SchedulingError as e:
+        await update.effective_message.reply_text(str(e))
+        return
+
+    await update.effective_message.reply_text(
+        f"Напоминание «{event.text}» для {user.username} создано на {event.scheduled_to}"
+    )
+
+
+async def list(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    assert update.effective_user is not None
+    assert update.effective_message is not None
+    assert context.job_queue is not None
+    assert update.effective_message.text is not None
+
+    reminders = [
+        f"{idx}. {r.text}: {describe(r)}"
+        for idx, r in enumerate(await list_events(EventType.CUSTOM))
+    ]
+
+    msg = "\n".join(reminders) if len(reminders) else "No reminders"
+
+    await update.effective_message.reply_text(msg)
+
+
+async def cancel(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    assert update.effective_user is not None
+    assert update.effective_message is not None
+    assert context.job_queue is not None
+    assert update.effective_message.text is not None
+
+    try:
+        id = parse_event_id(update.effective_message.text)
+        reminder_repr = await delete_event(context.job_queue, id, EventType.CUSTOM)
+    except SchedulingError as e:
+        await update.effective_message.reply_text(str(e))
+        return
+
+    await update.effective_message.reply_text(f"Удалено напоминание {reminder_repr}")
+
+
+async def confirm(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    assert update.effective_user is not None
+    assert update.effective_message is not None
+    assert context.job_queue is not None
+    assert update.effective_message.text is not None
+
+    try:
+        id = parse_event_id(update.effective_message.text)
+        next_date = await confirm_event(context.job_queue, id)
+    except SchedulingError as e:
+        await update.effective_message.reply_text(str(e))
+        return
+
+    if next_date is None:
+        await update.effective_message.reply_text(f"Напоминание подтверждено")
+    else:
+        await update.effective_message.reply_text(
+            f"Напоминание подтверждено, следующее {next_date}"
+        )
+
+
+def __parse(
+    text: str, now: datetime
+) -> Tuple[datetime, Optional[int], Optional[datetime], bool, str]:
+    date, rest = parse_datetime(text, now, DEFAULT_HOUR)
+    if date <= now:
+        raise DateParseError(f"Date {date} is in the past")
+
+    interval, rest = parse_interval(rest)
+
+    until = None
+    word, _sep, tail = rest.partition(" ")
+    if word.lower() in __until_words:
+        # Relative words like "завтра" are counted from today, not from the date
+        until_date, rest = parse_date(tail, now)
+        # Inclusive, up to the end of the day
+        until = until_date.next_occurrence(now, 23, 59)
+        if until < date:
+            raise DateParseError(f"End date {until} is before {date}")
+
+    need_confirmation = rest.startswith(__confirmation_flag)
+    if need_confirmation:
+        rest = rest[len(__confirmation_flag) :].strip()
+
+    if not rest:
+        raise DateParseError("Reminder text is not specified")
+
+    return date, interval, until, need_confirmation, rest
@@ -0,0 +1,293 @@
+import re
+import calendar
+from datetime import datetime, timedelta
+
+from typing import NamedTuple, Optional, Tuple
+
+# Numeric dates are always read day first: "03/03/1990" is the 3rd of March.
+# A year of any other length ("1.2.3") makes the whole date invalid.
+_NUMERIC_DATE = re.compile(
+    r"\s*(?P<day>\d{1,2})(?P<sep>[./-])(?P<month>\d{1,2})(?:(?P=sep)(?P<year>\d{4}|\d{2}))?(?!\d|(?P=sep)\d)"
+)
+
+_TOKEN = re.compile(
+    r"""
+    \s*(?:
+        (?P<iso>(?P<iso_year>\d{4})-(?P<iso_month>\d{1,2})-(?P<iso_day>\d{1,2}))(?!\d)
+      | (?P<numeric>(?P<day>\d{1,2})(?P<sep>[./-])(?P<month>\d{1,2})(?:(?P=sep)(?P<year>\d{4}|\d{2}))?)(?!\d|(?P=sep)\d)
+      | (?P<time>(?P<hour>\d{1,2}):(?P<minute>\d{2}))(?!\d)
+      | (?P<number>\d+)
+      | (?P<word>[^\W\d_]+)\.?
+      | (?P<punct>[^\s\w])
+    )
+    """,
+    flags=re.VERBOSE,
+)
+
+_MONTH_NAMES = (
+    ("январь", "января", "янв", "january", "jan"),
+    ("февраль", "февраля", "фев", "february", "feb"),
+    ("март", "марта", "мар", "march", "mar"),
+    ("апрель", "апреля", "апр", "april", "apr"),
+    ("май", "мая", "may"),
+    ("июнь", "июня", "июн", "june", "jun"),
+    ("июль", "июля", "июл", "july", "jul"),
+    ("август", "августа", "авг", "august", "aug"),
+    ("сентябрь", "сентября", "сен", "сент", "september", "sep", "sept"),
+    ("октябрь", "октября", "окт", "october", "oct"),
+    ("ноябрь", "ноября", "ноя", "нояб", "november", "nov"),
+    ("декабрь", "декабря", "дек", "december", "dec"),
+)
+
+_MONTHS = {
+    name: number
+    for number, names in enumerate(_MONTH_NAMES, start=1)
+    for name in names
+}
+
+_RELATIVE_DAYS = {
+    "сегодня": 0,
+    "today": 0,
+    "завтра": 1,
+    "tomorrow": 1,
+    "послезавтра": 2,
+}
+
+_TIME_PREFIXES = ("в", "at")
+
+_INTERVAL = re.compile(
+    r"\s*(?:every|каждый|каждую|каждое|каждые)\s+(?:(?P<count>\d+)\s+)?(?P<unit>[^\W\d_]+)"
+    r"|\s*(?P<adverb>daily|weekly|ежедневно|еженедельно)(?![^\W\d_])",
+    flags=re.IGNORECASE,
+)
+
+_INTERVAL_UNITS = {
+    **dict.fromkeys(("minute", "minutes", "min", "минуту", "минуты", "минут", "мин"), 60),
+    **dict.fromkeys(("hour", "hours", "час", "часа", "часов"), 60 * 60),
+    **dict.fromkeys(("day", "days", "день", "дня", "дней"), 24 * 60 * 60),
+    **dict.fromkeys(
+        ("week", "weeks", "неделю", "недели", "недель"), 7 * 24 * 60 * 60
+    ),
+    **dict.fromkeys(("daily", "ежедневно"), 24 * 60 * 60),
+    **dict.fromkeys(("weekly", "еженедельно"), 7 * 24 * 60 * 60),
+}
+
+
+class DateParseError(ValueError):
+    pass
+
+
+class ParsedDate(NamedTuple):
+    day: int
+    month: int
+    year: Optional[int] = None
+
+    def next_occurrence(
+        self, now: datetime, hour: int, minute: int = 0
+    ) -> datetime:
+        """Resolve the date to an aware datetime in the timezone of `now`.
+
+        Dates without a year resolve to the nearest future occurrence.
+        """
+        if self.year is not None:
+            return datetime(
+                self.year, self.month, self.day, hour, minute, tzinfo=now.tzinfo
+            )
+
+        year = now.year
+        while True:
+            if self.day <= calendar.monthrange(year, self.month)[1]:
+                date = datetime(
+                    year, self.month, self.day, hour, minute, tzinfo=now.tzinfo
+                )
+                if date > now:
+                    return date
+            year += 1
+
+
+def parse_date(text: str, now: Optional[datetime] = None) -> Tuple[ParsedDate, str]:
+    """Parse a date at the beginning of `text`.
+
+    Returns the date and the rest of the text. Raises DateParseError if the text
+    doesn't start with a valid date.
+    """
+    # Fast path for the most common "dd.mm[.yyyy]" form
+    match = _NUMERIC_DATE.match(text)
+    if match is not None:
+        return _numeric(match, now), text[match.end() :].strip()
+
+    date, pos = _parse_date_tokens(text, 0, now)
+    return date, text[pos:].strip()
+
+
+def parse_datetime(
+    text: str, now: datetime, default_hour: int
+) -> Tuple[datetime, str]:
+    """Parse `<date> [[в|at] HH:MM]` or `[в|at] HH:MM` at the beginning of `text`.
+
+    Returns an aware datetime in the timezone of `now` and the rest of the text.
+    A bare time resolves to its next occurrence.
+    """
+    time = _parse_time(text, 0)
+    if time is not None:
+        hour, minute, pos = time
+        date = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+        if date <= now:
+            date += timedelta(days=1)
+        return date, text[pos:].strip()
+
+    date, pos = _parse_date_tokens(text, 0, now)
+
+    hour, minute = default_hour, 0
+    time = _parse_time(text, pos)
+    if time is not None:
+        hour, minute, pos = time
+
+    return date.next_occurrence(now, hour, minute), text[pos:].strip()
+
+
+def parse_interval(text: str) -> Tuple[Optional[int], str]:
+    """Parse an optional `every [N] <unit>` at the beginning of `text`.
+
+    Returns the interval in seconds (None if there is no interval) and the rest
+    of the text.
+    """
+    match = _INTERVAL.match(text)
+    if match is None:
+        return None, text.strip()
+
+    unit = (match["adverb"] or match["unit"]).lower()
+    if unit not in _INTERVAL_UNITS:
+        raise DateParseError(f"Unknown interval unit '{unit}'")
+
+    count = int(match["count"]) if match["count"] is not None else 1
+    if count < 1:
+        raise DateParseError("Interval must be positive")
+
+    return count * _INTERVAL_UNITS[unit], text[match.end() :].strip()
+
+
+def _next_token(text: str, pos: int) -> Tuple[Optional[re.Match], int]:
+    match = _TOKEN.match(text, pos)
+    if match is None:
+        return None, pos
+    return match, match.end()
+
+
+def _parse_date_tokens(
+    text: str, pos: int, now: Optional[datetime]
+) -> Tuple[ParsedDate, int]:
+    token, pos = _next_token(text, pos)
+    if token is None:
+        raise DateParseError("Date is not specified")
+
+    kind = token.lastgroup
+    if kind == "iso":
+        return (
+            _validate(
+                int(token["iso_day"]), int(token["iso_month"]), int(token["iso_year"])
+            ),
+            pos,
+        )
+
+    if kind == "numeric":
+        return _numeric(token, now), pos
+
+    if kind == "number":
+        day = int(token["number"])
+        month_token, pos = _next_token(text, pos)
+        if month_token is None or month_token.lastgroup != "word":
+            raise DateParseError(f"Month is not specified after day {day}")
+        month = _month(month_token["word"])
+        year, pos = _optional_year(text, pos)
+        return _validate(day, month, year), pos
+
+    if kind == "word":
+        word = token["word"].lower()
+        if word in _RELATIVE_DAYS:
+            if now is None:
+                raise DateParseError(f"Unable to resolve relative date '{word}'")
+            date = now + timedelta(days=_RELATIVE_DAYS[word])
+            return ParsedDate(date.day, date.month, date.year), pos
+
+        month = _month(word)
+        day_token, pos = _next_token(text, pos)
+        if day_token is None or day_token.lastgroup != "number":
+            raise DateParseError(f"Day is not specified after month '{word}'")
+        # "March 3, 1990"
+        comma, after_comma = _next_token(text, pos)
+        if comma is not None and comma["punct"] == ",":
+            pos = after_comma
+        year, pos = _optional_year(text, pos)
+        return _validate(int(day_token["number"]), month, year), pos
+
+    raise DateParseError(f"Unrecognized date '{token.group().strip()}'")
+
+
+def _parse_time(text: str, pos: int) -> Optional[Tuple[int, int, int]]:
+    """Parse `[в|at] HH:MM` at `pos`, None if there is no time.
+
+    "в магазин" is a part of the text, not a time.
+    """
+    token, pos = _next_token(text, pos)
+    if (
+        token is not None
+        and token.lastgroup == "word"
+        and token["word"].lower() in _TIME_PREFIXES
+    ):
+        token, pos = _next_token(text, pos)
+
+    if token is None or token.lastgroup != "time":
+        return None
+
+    hour, minute = int(token["hour"]), int(token["minute"])
+    if hour > 23 or minute > 59:
+        raise DateParseError(f"Time {token['time']} is out of range")
+
+    return hour, minute, pos
+
+
+def _optional_year(text: str, pos: int) -> Tuple[Optional[int], int]:
+    token, end = _next_token(text, pos)
+    if token is not None and token.lastgroup == "number" and len(token["number"]) == 4:
+        return int(token["number"]), end
+    return None, pos
+
+
+def _numeric(match: re.Match, now: Optional[datetime]) -> ParsedDate:
+    year = match["year"]
+    return _validate(
+        int(match["day"]),
+        int(match["month"]),
+        _convert_year(int(year), now) if year is not None else None,
+    )
+
+
+def _month(word: str) -> int:
+    month = _MONTHS.get(word.lower())
+    if month is None:
+        raise DateParseError(f"Unknown month '{word}'")
+    return month
+
+
+def _validate(day: int, month: int, year: Optional[int]) -> ParsedDate:
+    if not 1 <= month <= 12:
+        raise DateParseError(f"Month {month} is out of range")
+
+    # Use a leap year to allow 29 of February when the year is unknown
+    last_day = calendar.monthrange(year if year is not None else 2000, month)[1]
+    if not 1 <= day <= last_day:
+        raise DateParseError(f"Day {day} is out of range for month {month}")
+
+    return ParsedDate(day, month, year)
+
+
+def _convert_year(year: int, now: Optional[datetime]) -> int:
+    if year >= 100:
+        return year
+
+    cur_year = (now or datetime.now()).year
+    if cur_year - 2000 < year:
+        return year + 1900
+    else:
+        return year + 2000
@@ -37,6 +37,13 @@ class Event(Document):
     since = DateTimeField(required=False)
     until = DateTimeField(required=False)
     interval = IntField(required=False)
+    chat_id = IntField(required=False)
+    attempts = IntField(default=0)
     job_id = StringField(required=True, unique=True)
+    idempotency_key = StringField(required=False, unique=True, sparse=True)
 
-    meta = {"collection": "events", "ordering": ["-created_at"]}
+    meta = {
+        "collection": "events",
+        "ordering": ["-created_at"],
+        "indexes": ["status"],
+    }
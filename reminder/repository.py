@@ -0,0 +1,106 @@
+from pymongo import DESCENDING, ReturnDocument
+
+from typing import Any, Dict, List, Optional
+
+from db import get_database
+from user import repository as users
+from reminder.model import Event
+
+# Queries use the mongoengine notation: {"id": ..., "status__ne": ..., "typ__in": [...]}
+Query = Dict[str, Any]
+
+
+def __collection():
+    return get_database()[Event._get_collection_name()]
+
+
+async def insert(event: Event) -> Event:
+    """Insert a new event, raises pymongo DuplicateKeyError on unique fields"""
+    event.validate()
+    result = await __collection().insert_one(event.to_mongo())
+    event.id = result.inserted_id
+    return event
+
+
+async def find_one(query: Query) -> Optional[Event]:
+    doc = await __collection().find_one(__filter(query))
+    if doc is None:
+        return None
+
+    return (await __load([doc]))[0]
+
+
+async def find(query: Query) -> List[Event]:
+    cursor = __collection().find(__filter(query), sort=[("created_at", DESCENDING)])
+    return await __load([doc async for doc in cursor])
+
+
+async def find_one_and_update(query: Query, **fields) -> Optional[Event]:
+    """Update a single event and return it with the changes applied"""
+    doc = await __collection().find_one_and_update(
+        __filter(query), __update(fields), return_document=ReturnDocument.AFTER
+    )
+    if doc is None:
+        return None
+
+    return (await __load([doc]))[0]
+
+
+async def update_one(query: Query, **fields) -> bool:
+    result = await __collection().update_one(__filter(query), __update(fields))
+    return result.modified_count > 0
+
+
+async def update_many(query: Query, **fields) -> int:
+    result = await __collection().update_many(__filter(query), __update(fields))
+    return result.modified_count
+
+
+async def delete(event: Event):
+    await __collection().delete_one({"_id": event.id})
+
+
+async def __load(docs: List[Dict[str, Any]]) -> List[Event]:
+    """Build events and resolve their users with one query instead of lazy loads"""
+    refs = ("created_by", "addressed_to")
+    user_ids = {doc[ref] for doc in docs for ref in refs if doc.get(ref) is not None}
+    resolved = await users.get_many(user_ids) if user_ids else {}
+
+    events = []
+    for doc in docs:
+        event = Event._from_son(doc)
+        for ref in refs:
+            setattr(event, ref, resolved.get(doc.get(ref)))
+        events.append(event)
+
+    return events
+
+
+def __filter(query: Query) -> Dict[str, Any]:
+    result: Dict[str, Any] = {}
+    for key, value in query.items():
+        name, _sep, op = key.partition("__")
+        field = Event._fields[name]
+
+        if isinstance(value, (list, tuple, set)):
+            value = [field.to_mongo(v) for v in value]
+        elif value is not None:
+            value = field.to_mongo(value)
+
+        if op:
+            result.setdefault(field.db_field, {})[f"${op}"] = value
+        else:
+            result[field.db_field] = value
+
+    return result
+
+
+def __update(fields: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "$set": {
+            Event._fields[name].db_field: (
+                Event._fields[name].to_mongo(value) if value is not None else None
+            )
+            for name, value in fields.items()
+        }
+    }
@@ -0,0 +1,533 @@
+"""Scheduling core shared by all reminder types.
+
+Every change of an event is a single-document write to the `events`
+collection and the event itself works as an outbox record for its job:
+
+* `CREATED` - the job with `job_id` has to be added to the job store
+* `DELETED` - the job has to be removed and the event deleted
+
+The pending operation is applied right away by `__flush` and, if the bot
+stops in between, by `flush_outbox` on the next start. Job ids are fixed
+before the event is written and jobs are added with `replace_existing`,
+so applying an operation twice is harmless.
+
+Jobs never expire as missed, a reminder due while the bot was down or the
+scheduler was paused runs late instead. `flush_outbox` also restores, once,
+the jobs that older versions dropped as missed.
+"""
+
+import logging
+
+from shortuuid import uuid
+from datetime import datetime, timedelta, timezone
+from zoneinfo import ZoneInfo
+
+from typing import List, Optional, cast
+
+from apscheduler.jobstores.base import JobLookupError
+from pymongo.errors import DuplicateKeyError
+from telegram.ext import ContextTypes, Application, JobQueue, Job
+
+from db import get_database
+from user import UNKNOWN_USER_MSG, repository as users
+from user.model import User
+
+from reminder import repository as events
+from reminder.model import Event, EventState, EventStatus, EventType
+from reminder.dateparse import ParsedDate
+from reminder import (
+    NOTHING_TO_CONFIRM_MSG,
+    UNABLE_CONFIRM_EVENT_MSG,
+    UNABLE_CREATE_EVENT_MSG,
+    UNABLE_DELETE_EVENT_MSG,
+    UNABLE_PARSE_EVENT_ID_MSG,
+    UNABLE_PAUSE_EVENT_MSG,
+    UNABLE_RESUME_EVENT_MSG,
+    UNABLE_SCHEDULE_REMINDER_MSG,
+    UNKNOWN_EVENT_MSG,
+)
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_HOUR = 9
+DEFAULT_ZONE = ZoneInfo("Europe/Kaliningrad")
+
+# Confirmation-gated reminders are repeated with a growing delay until they are
+# acknowledged or the attempts run out, then the next occurrence is scheduled
+MAX_CONFIRMATION_ATTEMPTS = 5
+CONFIRMATION_RETRY_DELAY = timedelta(minutes=10)
+MAX_CONFIRMATION_RETRY_DELAY = timedelta(hours=2)
+MAX_RESCHEDULE_ATTEMPTS = 3
+
+# A reminder lost by an older version is sent late only if it was missed recently
+MISSED_REMINDER_GRACE = timedelta(hours=12)
+MIGRATION_COLLECTION = "migrations"
+RESTORE_EXPIRED_JOBS = "restore_expired_jobs"
+
+
+class SchedulingError(Exception):
+    """Raised by the scheduling core, the message is safe to reply with"""
+
+
+class JobDescriptor(object):
+    def __init__(self, text: str, event_id):
+        self.text = text
+        self.event_id = event_id
+
+
+def make_idempotency_key(update_id: int) -> str:
+    """Telegram redelivers an update with the same id, use it to detect retries"""
+    return f"update:{update_id}"
+
+
+def parse_event_id(text: str) -> str:
+    try:
+        _cmd, id, *_remains = text.split(" ")
+    except Exception as e:
+        logger.error("Unable to parse event id: %s", e)
+        raise SchedulingError(UNABLE_PARSE_EVENT_ID_MSG) from e
+
+    return id
+
+
+async def get_user(user_id: int) -> User:
+    try:
+        user = await users.get(user_id)
+    except Exception as e:
+        logger.error("Unable to get user %s: %s", user_id, e)
+        raise SchedulingError(UNKNOWN_USER_MSG) from e
+
+    if user is None:
+        logger.error("Unknown user %s", user_id)
+        raise SchedulingError(UNKNOWN_USER_MSG)
+
+    return user
+
+
+async def get_event(event_id: str, typ: Optional[EventType] = None) -> Event:
+    try:
+        event = await events.find_one(__query(event_id, typ))
+    except Exception as e:
+        logger.error("Unable to get event %s: %s", event_id, e)
+        raise SchedulingError(UNKNOWN_EVENT_MSG) from e
+
+    if event is None:
+        logger.error("Unknown event %s", event_id)
+        raise SchedulingError(UNKNOWN_EVENT_MSG)
+
+    return event
+
+
+async def list_events(typ: EventType) -> List[Event]:
+    return await events.find({"typ": typ, "status__ne": EventStatus.DELETED})
+
+
+def describe(event: Event) -> str:
+    return f"{event.name} for {event.addressed_to.username} by {event.created_by.username} at {event.scheduled_to} ({event.id})"
+
+
+async def create_event(
+    job_queue: JobQueue,
+    user: User,
+    chat_id: int,
+    text: str,
+    typ: EventType,
+    date: datetime,
+    name: Optional[str] = None,
+    interval: Optional[int] = None,
+    until: Optional[datetime] = None,
+    need_confirmation: bool = False,
+    idempotency_key: Optional[str] = None,
+) -> Event:
+    """Create an event and its job.
+
+    A retry with the same `idempotency_key` returns the already created event
+    instead of creating a duplicate.
+    """
+    job_id = uuid(name=idempotency_key) if idempotency_key != None else uuid()
+
+    try:
+        event = await events.insert(
+            Event(
+                name=name if name is not None else f"Reminder {job_id}",
+                text=text,
+                created_by=user,
+                addressed_to=user,
+                state=EventState.ENABLED,
+                status=EventStatus.CREATED,
+                typ=typ,
+                scheduled_to=date,
+                need_confirmation=need_confirmation,
+                since=date,
+                until=until,
+                interval=interval,
+                chat_id=chat_id,
+                job_id=job_id,
+                idempotency_key=idempotency_key,
+            )
+        )
+    except DuplicateKeyError as e:
+        event = (
+            await events.find_one({"idempotency_key": idempotency_key})
+            if idempotency_key != None
+            else None
+        )
+        if event is None:
+            logger.error("Unable to create event: %s", e)
+            raise SchedulingError(UNABLE_CREATE_EVENT_MSG) from e
+
+        logger.info("Event for %s already exists", idempotency_key)
+    except Exception as e:
+        logger.error("Unable to create event: %s", e)
+        raise SchedulingError(UNABLE_CREATE_EVENT_MSG) from e
+
+    try:
+        await __flush(job_queue, event)
+    except Exception as e:
+        logger.error("Unable to schedule reminder: %s", e)
+        await __discard(job_queue, event)
+        raise SchedulingError(UNABLE_SCHEDULE_REMINDER_MSG) from e
+
+    return event
+
+
+async def delete_event(
+    job_queue: JobQueue, event_id: str, typ: Optional[EventType] = None
+) -> str:
+    try:
+        event = await events.find_one_and_update(
+            __query(event_id, typ), status=EventStatus.DELETED
+        )
+    except Exception as e:
+        logger.error("Unable to delete event: %s", e)
+        raise SchedulingError(UNABLE_DELETE_EVENT_MSG) from e
+
+    if event is None:
+        logger.error("Unknown event %s", event_id)
+        raise SchedulingError(UNKNOWN_EVENT_MSG)
+
+    event_repr = describe(event)
+
+    try:
+        await __flush(job_queue, event)
+    except Exception as e:
+        # The event is already hidden, the job is removed on the next flush
+        logger.error("Unable to delete event: %s", e)
+        raise SchedulingError(UNABLE_DELETE_EVENT_MSG) from e
+
+    return event_repr
+
+
+async def enable_event(
+    job_queue: JobQueue, event_id: str, typ: Optional[EventType] = None
+) -> Event:
+    event = await __set_state(event_id, typ, EventState.ENABLED)
+
+    try:
+        if job_queue.scheduler.get_job(event.job_id) != None:
+            job_queue.scheduler.resume_job(event.job_id)
+            return event
+    except Exception as e:
+        logger.error("Unable to resume job: %s", e)
+        raise SchedulingError(UNABLE_RESUME_EVENT_MSG) from e
+
+    # The job was skipped while the event was disabled
+    scheduled_to = __aware(event.scheduled_to)
+    if scheduled_to <= datetime.now(timezone.utc):
+        scheduled_to = next_occurrence(event)
+
+    await __reschedule(job_queue, event, scheduled_to, attempts=0)
+
+    return event
+
+
+async def disable_event(
+    job_queue: JobQueue, event_id: str, typ: Optional[EventType] = None
+) -> Event:
+    event = await __set_state(event_id, typ, EventState.DISABLED)
+
+    try:
+        if job_queue.scheduler.get_job(event.job_id) != None:
+            job_queue.scheduler.pause_job(event.job_id)
+    except Exception as e:
+        logger.error("Unable to pause job: %s", e)
+        raise SchedulingError(UNABLE_PAUSE_EVENT_MSG) from e
+
+    return event
+
+
+async def confirm_event(job_queue: JobQueue, event_id: str) -> Optional[datetime]:
+    """Acknowledge a confirmation-gated reminder and move to its next occurrence"""
+    event = await get_event(event_id)
+
+    if not event.need_confirmation or not event.attempts:
+        raise SchedulingError(NOTHING_TO_CONFIRM_MSG)
+
+    for _attempt in range(MAX_RESCHEDULE_ATTEMPTS):
+        try:
+            job_queue.scheduler.remove_job(event.job_id)
+        except JobLookupError:
+            pass
+        except Exception as e:
+            logger.error("Unable to remove retry job: %s", e)
+            raise SchedulingError(UNABLE_CONFIRM_EVENT_MSG) from e
+
+        date = next_occurrence(event)
+        if await __reschedule(job_queue, event, date, attempts=0):
+            return date
+
+        # The retry job has just run and rescheduled itself, confirm that one
+        event = await get_event(event_id)
+        if not event.need_confirmation or not event.attempts:
+            raise SchedulingError(NOTHING_TO_CONFIRM_MSG)
+
+    raise SchedulingError(UNABLE_CONFIRM_EVENT_MSG)
+
+
+def next_occurrence(event: Event, now: Optional[datetime] = None) -> Optional[datetime]:
+    """Return the occurrence after `event.scheduled_to` or None if there is no one"""
+    last = __aware(event.scheduled_to)
+    now = max(now or datetime.now(timezone.utc), last)
+
+    if event.typ == EventType.BIRTHDAY:
+        local = last.astimezone(DEFAULT_ZONE)
+        return ParsedDate(local.day, local.month).next_occurrence(
+            now.astimezone(DEFAULT_ZONE), local.hour, local.minute
+        )
+
+    if not event.interval:
+        return None
+
+    step = timedelta(seconds=event.interval)
+    # Skip occurrences missed while the bot was down
+    date = last + step * ((now - last) // step + 1)
+
+    if event.until is not None and date > __aware(event.until):
+        return None
+
+    return date
+
+
+async def flush_outbox(application: Application):
+    """Apply job operations left pending by a previous run and restore lost jobs"""
+    assert application.job_queue is not None
+
+    pending = await events.find(
+        {"status__in": [EventStatus.CREATED, EventStatus.DELETED]}
+    )
+    for event in pending:
+        try:
+            await __flush(application.job_queue, event)
+        except Exception as e:
+            logger.error("Unable to flush event %s: %s", event.id, e)
+
+    await __restore_expired_jobs(application.job_queue)
+
+
+async def __restore_expired_jobs(job_queue: JobQueue):
+    """One-time migration of events whose jobs older versions lost.
+
+    Those jobs expired as missed when they were late for more than a second,
+    birthdays and recurring reminders must not stop because of that. Only a
+    recently missed occurrence is sent late, older ones are skipped.
+    """
+    migrations = get_database()[MIGRATION_COLLECTION]
+    if await migrations.find_one({"_id": RESTORE_EXPIRED_JOBS}) is not None:
+        return
+
+    now = datetime.now(timezone.utc)
+    failed = False
+
+    expired = await events.find(
+        {"status": EventStatus.EXPIRED, "state": EventState.ENABLED}
+    )
+    for event in expired:
+        if event.scheduled_to is None:
+            continue
+
+        date = next_occurrence(event, now)
+        if date is None:
+            continue
+
+        scheduled_to = __aware(event.scheduled_to)
+        if now - scheduled_to <= MISSED_REMINDER_GRACE:
+            date = scheduled_to
+
+        try:
+            await __reschedule(job_queue, event, date, attempts=0)
+        except Exception as e:
+            logger.error("Unable to restore event %s: %s", event.id, e)
+            failed = True
+
+    # Retried by the next leader if some events were not restored
+    if not failed:
+        await migrations.update_one(
+            {"_id": RESTORE_EXPIRED_JOBS}, {"$set": {"applied_at": now}}, upsert=True
+        )
+        logger.info("Checked %d expired events for lost jobs", len(expired))
+
+
+async def notify(context: ContextTypes.DEFAULT_TYPE) -> None:
+    job = context.job
+
+    assert job is not None
+    assert job.chat_id is not None
+    assert job.data is not None
+    assert context.job_queue is not None
+
+    data = cast(JobDescriptor, job.data)
+
+    event = await events.find_one(
+        {"id": data.event_id, "status__ne": EventStatus.DELETED}
+    )
+    if event is None:
+        logger.warning("Unable to execute deleted Event with id %s", data.event_id)
+        return
+
+    if event.job_id != job.id:
+        # The event was rescheduled by someone else, only its current job runs
+        logger.warning("Skip stale job %s of Event with id %s", job.id, event.id)
+        return
+
+    if event.state == EventState.DISABLED:
+        logger.warning("Unable to execute disabled Event with id %s", data.event_id)
+        return
+
+    awaiting = event.need_confirmation and event.attempts < MAX_CONFIRMATION_ATTEMPTS
+
+    text = f"Напоминаю! {data.text} !"
+    if awaiting:
+        text += f"\nПодтвердите: /confirm_reminder {event.id}"
+
+    await context.bot.send_message(job.chat_id, text=text)
+
+    try:
+        if awaiting:
+            await __reschedule(
+                context.job_queue, event, event.scheduled_to, event.attempts + 1
+            )
+        else:
+            await __reschedule(context.job_queue, event, next_occurrence(event), 0)
+    except SchedulingError as e:
+        await context.bot.send_message(job.chat_id, str(e))
+
+
+async def __reschedule(
+    job_queue: JobQueue,
+    event: Event,
+    scheduled_to: Optional[datetime],
+    attempts: int,
+) -> bool:
+    """Replace the job of `event`, False if it was rescheduled concurrently.
+
+    The update is conditional on the job id `event` was loaded with, so of two
+    racing reschedules only one adds a job.
+    """
+    query = {"id": event.id, "job_id": event.job_id, "status__ne": EventStatus.DELETED}
+
+    if scheduled_to is None:
+        return await events.update_one(query, status=EventStatus.EXPIRED, attempts=0)
+
+    # Record the new job first, so it is not lost if adding it fails
+    event = await events.find_one_and_update(
+        query,
+        scheduled_to=scheduled_to,
+        attempts=attempts,
+        job_id=uuid(),
+        status=EventStatus.CREATED,
+    )
+    if event is None:
+        logger.info("Event %s was rescheduled concurrently", query["id"])
+        return False
+
+    try:
+        await __flush(job_queue, event)
+    except Exception as e:
+        logger.error("Unable to schedule reminder: %s", e)
+        raise SchedulingError(UNABLE_SCHEDULE_REMINDER_MSG) from e
+
+    return True
+
+
+async def __flush(job_queue: JobQueue, event: Event):
+    if event.status == EventStatus.CREATED:
+        __schedule(job_queue, event, __run_at(event), event.job_id)
+        await events.update_one(
+            {"id": event.id, "job_id": event.job_id, "status": EventStatus.CREATED},
+            status=EventStatus.SCHEDULED,
+        )
+
+    elif event.status == EventStatus.DELETED:
+        try:
+            job_queue.scheduler.remove_job(event.job_id)
+        except JobLookupError:
+            pass
+        await events.delete(event)
+
+
+async def __discard(job_queue: JobQueue, event: Event):
+    try:
+        event.status = EventStatus.DELETED
+        await events.update_one({"id": event.id}, status=EventStatus.DELETED)
+        await __flush(job_queue, event)
+    except Exception as e:
+        logger.error("Unable to discard event %s: %s", event.id, e)
+
+
+def __run_at(event: Event) -> datetime:
+    now = datetime.now(timezone.utc)
+
+    if event.attempts:
+        delay = CONFIRMATION_RETRY_DELAY * 2 ** (event.attempts - 1)
+        return now + min(delay, MAX_CONFIRMATION_RETRY_DELAY)
+
+    # Missed while the bot was down, run it now
+    return max(__aware(event.scheduled_to), now)
+
+
+def __schedule(job_queue: JobQueue, event: Event, date: datetime, job_id: str) -> Job:
+    chat_id = event.chat_id if event.chat_id != None else event.addressed_to.user_id
+
+    return job_queue.run_once(
+        notify,
+        date,
+        chat_id=chat_id,
+        name=event.name,
+        data=JobDescriptor(event.text, event.id),
+        job_kwargs={
+            "id": job_id,
+            "replace_existing": True,
+            # Run reminders due while the bot was down or the scheduler paused
+            # for a leader failover instead of dropping them as missed
+            "misfire_grace_time": None,
+            "coalesce": True,
+        },
+    )
+
+
+async def __set_state(
+    event_id: str, typ: Optional[EventType], state: EventState
+) -> Event:
+    try:
+        event = await events.find_one_and_update(__query(event_id, typ), state=state)
+    except Exception as e:
+        logger.error("Unable to update event %s: %s", event_id, e)
+        raise SchedulingError(UNKNOWN_EVENT_MSG) from e
+
+    if event is None:
+        logger.error("Unknown event %s", event_id)
+        raise SchedulingError(UNKNOWN_EVENT_MSG)
+
+    return event
+
+
+def __query(event_id: str, typ: Optional[EventType]) -> events.Query:
+    query = {"id": event_id, "status__ne": EventStatus.DELETED}
+    if typ is not None:
+        query["typ"] = typ
+    return query
+
+
+def __aware(date: datetime) -> datetime:
+    # MongoDB returns naive datetimes in UTC
+    return date if date.tzinfo is not None else date.replace(tzinfo=timezone.utc)
@@ -1,6 +1,8 @@
 from pydantic_settings import BaseSettings, SettingsConfigDict
 from pydantic import SecretStr
 
+from typing import Dict, List, Optional
+
 
 class Settings(BaseSettings):
     model_config = SettingsConfigDict(
@@ -18,3 +20,45 @@ class Settings(BaseSettings):
     deluge_port: int
     deluge_username: SecretStr
     deluge_password: SecretStr
+
+    health_host: str = "0.0.0.0"
+    health_port: int = 8080
+    # Seconds between background probes of MongoDB, Deluge and the scheduler
+    health_interval: int = 30
+    health_timeout: int = 5
+    # A job that is late for more than this number of seconds means the scheduler is stuck
+    health_overdue_grace: int = 300
+
+    # Event loop stalls and handler blocking above this number of seconds are reported
+    stall_threshold: float = 0.25
+    # Telegram user ids allowed to run admin commands
+    admin_ids: List[int] = []
+
+    # Size of the connection pool used by the async repositories
+    mongo_pool_size: int = 50
+
+    # Telegram pushes updates to this url instead of long polling, required to
+    # run several replicas behind a load balancer
+    webhook_url: Optional[str] = None
+    webhook_listen: str = "0.0.0.0"
+    webhook_port: int = 8443
+    webhook_secret: Optional[SecretStr] = None
+
+    # Replicas elect the scheduler leader with a lease of this many seconds
+    lease_ttl: int = 15
+    # Defaults to hostname:pid
+    instance_id: Optional[str] = None
+
+    # Seconds the Deluge torrent status snapshot behind the infohash index is reused
+    torrent_cache_ttl: int = 30
+
+    # Root log level and "json" or "text" records
+    log_level: str = "INFO"
+    log_format: str = "json"
+    # Levels of single loggers, e.g. LOG_LEVELS='{"apscheduler": "WARNING"}'
+    log_levels: Dict[str, str] = {}
+    # Records below WARNING from these loggers are limited to log_sample_rate
+    # per message every log_sample_window seconds
+    log_sampled: List[str] = ["apscheduler", "reminder"]
+    log_sample_rate: int = 10
+    log_sample_window: float = 60
@@ -0,0 +1,18 @@
+"""reminder.dateparse loaded on its own.
+
+Importing it through the package would pull in telegram, APScheduler and
+MongoDB, while the parser itself has no dependencies.
+"""
+
+import sys
+import importlib.util
+from pathlib import Path
+
+_PATH = Path(__file__).resolve().parent.parent / "reminder" / "dateparse.py"
+
+_spec = importlib.util.spec_from_file_location("dateparse", _PATH)
+assert _spec is not None and _spec.loader is not None
+
+dateparse = importlib.util.module_from_spec(_spec)
+sys.modules[_spec.name] = dateparse
+_spec.loader.exec_module(dateparse)
@@ -0,0 +1,34 @@
+"""Compare the numeric fast path of parse_date with the tokenizer.
+
+    python -m tests.bench_dateparse
+"""
+
+import timeit
+
+from tests._dateparse import dateparse
+
+NUMBER = 100_000
+
+TEXT = "03.03.1990 Вася"
+
+
+def tokenizer():
+    date, pos = dateparse._parse_date_tokens(TEXT, 0, None)
+    return date, TEXT[pos:].strip()
+
+
+CASES = {
+    "fast path": lambda: dateparse.parse_date(TEXT),
+    "tokenizer": tokenizer,
+    "month name": lambda: dateparse.parse_date("3 марта 1990 Вася"),
+}
+
+
+def main():
+    for name, case in CASES.items():
+        best = min(timeit.repeat(case, number=NUMBER, repeat=5))
+        print(f"{name:>10}: {best / NUMBER * 1e6:.2f} us per call")
+
+
+if __name__ == "__main__":
+    main()
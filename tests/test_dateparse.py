@@ -0,0 +1,137 @@
+import random
+import calendar
+from datetime import datetime
+from zoneinfo import ZoneInfo
+
+import pytest
+
+from tests._dateparse import dateparse
+
+DateParseError = dateparse.DateParseError
+ParsedDate = dateparse.ParsedDate
+parse_date = dateparse.parse_date
+parse_datetime = dateparse.parse_datetime
+parse_interval = dateparse.parse_interval
+
+NOW = datetime(2026, 10, 19, 12, 0, tzinfo=ZoneInfo("Europe/Kaliningrad"))
+LEAP_YEAR = 2000
+SEPARATORS = "./-"
+
+
+def days():
+    """Every day of a leap year"""
+    for month in range(1, 13):
+        for day in range(1, calendar.monthrange(LEAP_YEAR, month)[1] + 1):
+            yield day, month
+
+
+@pytest.mark.parametrize("names", dateparse._MONTH_NAMES, ids=lambda n: n[0])
+def test_month_names_round_trip(names):
+    month = dateparse._MONTHS[names[0]]
+    last_day = calendar.monthrange(LEAP_YEAR, month)[1]
+
+    for name in names:
+        for spelled in (name, name.capitalize(), name.upper()):
+            for day in range(1, last_day + 1):
+                for text, year in (
+                    (f"{day} {spelled} Вася", None),
+                    (f"{day} {spelled} {LEAP_YEAR} Вася", LEAP_YEAR),
+                    (f"{spelled} {day} Вася", None),
+                    (f"{spelled} {day}, {LEAP_YEAR} Вася", LEAP_YEAR),
+                ):
+                    assert parse_date(text, NOW) == (
+                        ParsedDate(day, month, year),
+                        "Вася",
+                    ), text
+
+
+@pytest.mark.parametrize("sep", SEPARATORS)
+def test_numeric_round_trip(sep):
+    for day, month in days():
+        for d, m in ((str(day), str(month)), (f"{day:02}", f"{month:02}")):
+            for suffix, year in (
+                ("", None),
+                (f"{sep}{LEAP_YEAR}", LEAP_YEAR),
+                (f"{sep}{LEAP_YEAR % 100:02}", LEAP_YEAR),
+            ):
+                text = f"{d}{sep}{m}{suffix}"
+                expected = ParsedDate(day, month, year)
+
+                # Both the fast path and the tokenizer read it the same way
+                assert parse_date(f"{text} Вася", NOW) == (expected, "Вася"), text
+                assert dateparse._parse_date_tokens(text, 0, NOW) == (
+                    expected,
+                    len(text),
+                ), text
+
+
+def test_iso_round_trip():
+    for day, month in days():
+        text = f"{LEAP_YEAR}-{month:02}-{day:02}"
+        assert parse_date(f"{text} Вася", NOW) == (
+            ParsedDate(day, month, LEAP_YEAR),
+            "Вася",
+        )
+
+
+def test_invalid_day_or_month_always_raises():
+    rng = random.Random(0)
+    for _ in range(2000):
+        month = rng.randint(1, 12)
+        day = rng.randint(1, 31)
+        if rng.random() < 0.5:
+            month = rng.choice([0, *range(13, 100)])
+        elif day <= calendar.monthrange(LEAP_YEAR, month)[1]:
+            day = rng.choice([0, calendar.monthrange(LEAP_YEAR, month)[1] + 1])
+
+        sep = rng.choice(SEPARATORS)
+        for text in (f"{day}{sep}{month}", f"{day:02}{sep}{month:02}{sep}{LEAP_YEAR}"):
+            with pytest.raises(DateParseError):
+                parse_date(f"{text} Вася", NOW)
+
+        if 1 <= month <= 12:
+            name = rng.choice(dateparse._MONTH_NAMES[month - 1])
+            with pytest.raises(DateParseError):
+                parse_date(f"{day} {name} Вася", NOW)
+
+
+@pytest.mark.parametrize(
+    "text", ["29.02.2023", "31 апреля", "30 feb", "1.2.3 Вася", "1/2/345 Вася"]
+)
+def test_invalid_dates(text):
+    with pytest.raises(DateParseError):
+        parse_date(text, NOW)
+
+
+@pytest.mark.parametrize(
+    "text, expected, rest",
+    [
+        ("завтра в магазин", datetime(2026, 10, 20, 9, 0), "в магазин"),
+        ("3 марта в магазин", datetime(2027, 3, 3, 9, 0), "в магазин"),
+        ("3 марта в 10:30 купить хлеб", datetime(2027, 3, 3, 10, 30), "купить хлеб"),
+        ("march 3 at 7:05 call", datetime(2027, 3, 3, 7, 5), "call"),
+        ("в 10:30 чай", datetime(2026, 10, 20, 10, 30), "чай"),
+        ("13:00 обед", datetime(2026, 10, 19, 13, 0), "обед"),
+    ],
+)
+def test_parse_datetime(text, expected, rest):
+    assert parse_datetime(text, NOW, 9) == (expected.replace(tzinfo=NOW.tzinfo), rest)
+
+
+def test_next_occurrence_of_29_february():
+    assert ParsedDate(29, 2).next_occurrence(NOW, 9) == datetime(
+        2028, 2, 29, 9, tzinfo=NOW.tzinfo
+    )
+
+
+@pytest.mark.parametrize(
+    "text, seconds, rest",
+    [
+        ("каждые 2 часа пить воду", 2 * 60 * 60, "пить воду"),
+        ("every week review", 7 * 24 * 60 * 60, "review"),
+        ("ежедневно зарядка", 24 * 60 * 60, "зарядка"),
+        ("просто текст", None, "просто текст"),
+    ],
+)
+def test_parse_interval(text, seconds, rest):
+    assert parse_interval(text) == (seconds, rest)
@@ -0,0 +1,64 @@
+import pytest
+
+from torrent.index import TorrentInfo
+from torrent.selector import SelectorError, parse_selector
+
+TORRENTS = [
+    TorrentInfo("aabbccdd" + "0" * 32, "The Matrix 1999 1080p", "Seeding", 100, 2.5),
+    TorrentInfo("11223344" + "0" * 32, "Some Other Movie", "Seeding", 100, 1.0),
+    TorrentInfo("ffeedd11" + "0" * 32, "The Office S01", "Paused", 50, 3.0),
+    TorrentInfo("facade00" + "0" * 32, "Debian 12", "Downloading", 10, 0.0),
+    TorrentInfo("99887766" + "0" * 32, "Facade.Movie.2020", "Seeding", 100, 0.5),
+]
+
+
+def select(text):
+    return [t.name for t in parse_selector(text.split()).select(TORRENTS)]
+
+
+@pytest.mark.parametrize(
+    "text, expected",
+    [
+        # Free text is a single substring, not a set of alternatives
+        ("The Matrix", ["The Matrix 1999 1080p"]),
+        ("the office", ["The Office S01"]),
+        ("movie", ["Some Other Movie", "Facade.Movie.2020"]),
+        # Dots and spaces in names are alike
+        ("facade movie", ["Facade.Movie.2020"]),
+        ("*matrix* debian*", ["The Matrix 1999 1080p", "Debian 12"]),
+        ("*office* the?matrix*", ["The Matrix 1999 1080p", "The Office S01"]),
+        ("all", [t.name for t in TORRENTS]),
+        ("seeding", ["The Matrix 1999 1080p", "Some Other Movie", "Facade.Movie.2020"]),
+        ("all seeding > 2.0 ratio", ["The Matrix 1999 1080p"]),
+        ("seeding ratio <= 1", ["Some Other Movie", "Facade.Movie.2020"]),
+        ("progress<100", ["The Office S01", "Debian 12"]),
+        ("the paused", ["The Office S01"]),
+        ("aabbcc", ["The Matrix 1999 1080p"]),
+        ("#aabbcc id:112233", ["The Matrix 1999 1080p", "Some Other Movie"]),
+        # A hex word is an id when an infohash starts with it...
+        ("facade", ["Debian 12"]),
+        # ...and a name otherwise
+        ("decade", []),
+        ("beaded", []),
+        ("nothing like this", []),
+    ],
+)
+def test_select(text, expected):
+    assert select(text) == expected
+
+
+def test_hex_word_without_matching_infohash_is_a_name():
+    torrents = [TorrentInfo("0" * 40, "Accede Live", "Seeding", 100, 1.0)]
+    assert parse_selector(["accede"]).select(torrents) == torrents
+
+
+def test_hex_word_inside_a_phrase_is_a_name():
+    assert select("facade.movie") == ["Facade.Movie.2020"]
+
+
+@pytest.mark.parametrize(
+    "text", ["", "ratio >", "> 2", "foo > 2", "#xyz", "id:12", "progress"]
+)
+def test_invalid_selectors(text):
+    with pytest.raises(SelectorError):
+        parse_selector(text.split())
@@ -0,0 +1,7 @@
+UNABLE_ADD_TORRENT_MSG = "Hе удалось добавить торрент"
+UNABLE_LIST_TORRENTS_MSG = "Не удалось получить список торрентов"
+UNABLE_PARSE_TORRENT_FILE_MSG = "Ошибка обработки торрент файла"
+TORRENT_FILE_NOT_FOUND_MSG = "Прикреплённый торрент файл не найден"
+TORRENT_EXISTS_MSG = "Торрент уже добавлен"
+NO_TORRENTS_FOUND_MSG = "Торренты не найдены"
+UNABLE_UPDATE_TORRENTS_MSG = "Не удалось изменить торренты"
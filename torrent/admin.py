@@ -0,0 +1,180 @@
+import logging
+
+from typing import Any, List, Optional, Tuple
+
+from telegram import Update
+from telegram.ext import Application, CommandHandler, ContextTypes, filters
+
+from torrent import (
+    NO_TORRENTS_FOUND_MSG,
+    UNABLE_LIST_TORRENTS_MSG,
+    UNABLE_UPDATE_TORRENTS_MSG,
+)
+from torrent.client import DelugeConnection
+from torrent.index import TorrentIndex, TorrentInfo
+from torrent.selector import SelectorError, parse_selector
+
+logger = logging.getLogger(__name__)
+
+MAX_SUMMARY_TORRENTS = 30
+
+USAGE = {
+    "pause": "Usage: /pause <ids|patterns|filters>",
+    "resume": "Usage: /resume <ids|patterns|filters>",
+    "remove": "Usage: /remove [--data] [--yes] <ids|patterns|filters>",
+    "move": "Usage: /move <ids|patterns|filters> </absolute/destination>",
+}
+
+
+def register_handlers(
+    application: Application, index: TorrentIndex, admin_ids: List[int]
+):
+    admins = filters.User(user_id=admin_ids)
+
+    async def pause(update: Update, context: ContextTypes.DEFAULT_TYPE):
+        await __run(update, context, index, "pause", "Остановлено")
+
+    async def resume(update: Update, context: ContextTypes.DEFAULT_TYPE):
+        await __run(update, context, index, "resume", "Запущено")
+
+    async def remove(update: Update, context: ContextTypes.DEFAULT_TYPE):
+        await __run(update, context, index, "remove", "Удалено")
+
+    async def move(update: Update, context: ContextTypes.DEFAULT_TYPE):
+        await __run(update, context, index, "move", "Перемещено")
+
+    application.add_handler(CommandHandler("pause", pause, filters=admins))
+    application.add_handler(CommandHandler("resume", resume, filters=admins))
+    application.add_handler(CommandHandler("remove", remove, filters=admins))
+    application.add_handler(CommandHandler("move", move, filters=admins))
+
+
+async def __run(
+    update: Update,
+    context: ContextTypes.DEFAULT_TYPE,
+    index: TorrentIndex,
+    command: str,
+    done: str,
+):
+    assert update.effective_message is not None
+
+    args = list(context.args or [])
+    remove_data = confirmed = False
+    if command == "remove":
+        remove_data, confirmed = "--data" in args, "--yes" in args
+        args = [arg for arg in args if arg not in ("--data", "--yes")]
+
+    destination = None
+    if command == "move":
+        # The destination is the rest of the arguments, it may contain spaces
+        start = next((i for i, arg in enumerate(args) if arg.startswith("/")), 0)
+        if start == 0:
+            await update.effective_message.reply_text(USAGE[command])
+            return
+        args, destination = args[:start], " ".join(args[start:])
+
+    try:
+        selector = parse_selector(args)
+    except SelectorError as e:
+        await update.effective_message.reply_text(f"{e}\n{USAGE[command]}")
+        return
+
+    try:
+        # Every selector is resolved against the same snapshot
+        await index.refresh()
+    except Exception as e:
+        logger.error("Unable to list torrents: %s", e)
+        await update.effective_message.reply_text(UNABLE_LIST_TORRENTS_MSG)
+        return
+
+    torrents = selector.select(index.all())
+    if not torrents:
+        await update.effective_message.reply_text(NO_TORRENTS_FOUND_MSG)
+        return
+
+    if command == "remove" and not confirmed and (remove_data or len(torrents) > 1):
+        await update.effective_message.reply_text(__confirmation(torrents, remove_data))
+        return
+
+    infohashes = [t.infohash for t in torrents]
+    logger.info("Run %s for %s torrents", command, len(infohashes))
+
+    try:
+        failed = await __call(
+            index.deluge, command, infohashes, remove_data, destination
+        )
+    except Exception as e:
+        logger.error("Unable to %s torrents: %s", command, e)
+        await update.effective_message.reply_text(f"{UNABLE_UPDATE_TORRENTS_MSG}: {e}")
+        return
+
+    if command == "remove":
+        index.discard([t.infohash for t in torrents if t.infohash not in failed])
+    index.invalidate()
+
+    await update.effective_message.reply_text(
+        __summary(done, torrents, failed, remove_data, destination)
+    )
+
+
+async def __call(
+    deluge: DelugeConnection,
+    command: str,
+    infohashes: List[str],
+    remove_data: bool,
+    destination: Optional[str],
+) -> dict:
+    """Run the command as one RPC for all torrents, return errors by infohash"""
+    if command == "pause":
+        await deluge.acall("core.pause_torrents", infohashes)
+    elif command == "resume":
+        await deluge.acall("core.resume_torrents", infohashes)
+    elif command == "move":
+        await deluge.acall("core.move_storage", infohashes, destination)
+    elif command == "remove":
+        errors: List[Tuple[str, Any]] = await deluge.acall(
+            "core.remove_torrents", infohashes, remove_data
+        )
+        return {infohash.lower(): error for infohash, error in errors or []}
+
+    return {}
+
+
+def __summary(
+    done: str,
+    torrents: List[TorrentInfo],
+    failed: dict,
+    remove_data: bool,
+    destination: Optional[str],
+) -> str:
+    succeeded = [t for t in torrents if t.infohash not in failed]
+
+    header = f"{done} {len(succeeded)} из {len(torrents)}"
+    if remove_data:
+        header += " вместе с данными"
+    if destination is not None:
+        header += f" в {destination}"
+
+    lines = [header]
+    for t in succeeded[:MAX_SUMMARY_TORRENTS]:
+        lines.append(f"✓ {t.name}")
+    if len(succeeded) > MAX_SUMMARY_TORRENTS:
+        lines.append(f"... и ещё {len(succeeded) - MAX_SUMMARY_TORRENTS}")
+
+    for t in torrents:
+        if t.infohash in failed:
+            lines.append(f"✗ {t.name}: {failed[t.infohash]}")
+
+    return "\n".join(lines)
+
+
+def __confirmation(torrents: List[TorrentInfo], remove_data: bool) -> str:
+    what = "вместе с данными " if remove_data else ""
+    lines = [f"Будет удалено {what}{len(torrents)}:"]
+    for t in torrents[:MAX_SUMMARY_TORRENTS]:
+        lines.append(f"• {t.name}")
+    if len(torrents) > MAX_SUMMARY_TORRENTS:
+        lines.append(f"... и ещё {len(torrents) - MAX_SUMMARY_TORRENTS}")
+
+    lines.append("Повторите команду с --yes, чтобы подтвердить")
+    return "\n".join(lines)
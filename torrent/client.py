@@ -0,0 +1,63 @@
+import logging
+import threading
+
+import asyncio
+from deluge_client import DelugeRPCClient
+from deluge_client.client import RemoteException
+
+from typing import Any, Optional
+
+from settings import Settings
+
+logger = logging.getLogger(__name__)
+
+
+class DelugeConnection(object):
+    """A single Deluge RPC connection shared by all handlers.
+
+    DelugeRPCClient is blocking and not thread safe, so calls are serialized
+    with a lock and `acall` runs them in a worker thread. The connection is
+    opened on first use and reopened after a transport failure.
+    """
+
+    def __init__(self, settings: Settings):
+        self.settings = settings
+        self._client: Optional[DelugeRPCClient] = None
+        self._lock = threading.Lock()
+
+    def call(self, method: str, *args, **kwargs) -> Any:
+        with self._lock:
+            if self._client is None:
+                client = DelugeRPCClient(
+                    self.settings.deluge_addr,
+                    self.settings.deluge_port,
+                    self.settings.deluge_username.get_secret_value(),
+                    self.settings.deluge_password.get_secret_value(),
+                    decode_utf8=True,
+                )
+                client.connect()
+                self._client = client
+
+            try:
+                return self._client.call(method, *args, **kwargs)
+            except RemoteException:
+                raise
+            except Exception as e:
+                logger.warning("Deluge connection failed, will reconnect: %s", e)
+                self._drop()
+                raise
+
+    async def acall(self, method: str, *args, **kwargs) -> Any:
+        return await asyncio.to_thread(self.call, method, *args, **kwargs)
+
+    def close(self):
+        with self._lock:
+            self._drop()
+
+    def _drop(self):
+        if self._client is not None:
+            try:
+                self._client.disconnect()
+            except Exception:
+                pass
+            self._client = None
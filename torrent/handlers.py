@@ -0,0 +1,275 @@
+import logging
+import urllib.parse
+from base64 import b64encode
+
+from typing import Optional
+
+from telegram import MessageEntity, Update
+from telegram.ext import (
+    Application,
+    CommandHandler,
+    ContextTypes,
+    MessageHandler,
+    filters,
+)
+
+from settings import Settings
+from torrent import (
+    NO_TORRENTS_FOUND_MSG,
+    TORRENT_EXISTS_MSG,
+    TORRENT_FILE_NOT_FOUND_MSG,
+    UNABLE_ADD_TORRENT_MSG,
+    UNABLE_LIST_TORRENTS_MSG,
+    UNABLE_PARSE_TORRENT_FILE_MSG,
+)
+from torrent.admin import register_handlers as register_admin_handlers
+from torrent.client import DelugeConnection
+from torrent.index import (
+    TorrentIndex,
+    TorrentInfo,
+    infohash_from_magnet,
+    infohash_from_torrent,
+    parse_magnet_link,
+)
+
+logger = logging.getLogger(__name__)
+
+MAX_FIND_RESULTS = 50
+
+ADD_OPTIONS = {"add_paused": False, "auto_managed": True}
+
+
+def register_handlers(application: Application, settings: Settings):
+    deluge = DelugeConnection(settings)
+    index = TorrentIndex(deluge, settings.torrent_cache_ttl)
+
+    async def by_file(update: Update, context: ContextTypes.DEFAULT_TYPE):
+        await download_torrent_by_file(update, context, deluge, index)
+
+    async def by_link(update: Update, context: ContextTypes.DEFAULT_TYPE):
+        await donwload_torrent_by_link(update, context, deluge, index)
+
+    async def list_(update: Update, context: ContextTypes.DEFAULT_TYPE):
+        await list_torrents(update, context, index)
+
+    async def find(update: Update, context: ContextTypes.DEFAULT_TYPE):
+        await find_torrents(update, context, index)
+
+    download_torrent_by_file_handler = MessageHandler(
+        filters.Document.MimeType("application/x-bittorrent"), by_file
+    )
+
+    download_torrent_by_link_handler = CommandHandler("download", by_link)
+
+    list_torrents_handler = CommandHandler("list", list_)
+    find_torrents_handler = CommandHandler("find", find)
+
+    application.add_handler(download_torrent_by_file_handler)
+    application.add_handler(download_torrent_by_link_handler)
+    application.add_handler(list_torrents_handler)
+    application.add_handler(find_torrents_handler)
+
+    register_admin_handlers(application, index, settings.admin_ids)
+
+
+async def donwload_torrent_by_link(
+    update: Update,
+    context: ContextTypes.DEFAULT_TYPE,
+    deluge: DelugeConnection,
+    index: TorrentIndex,
+):
+    """Download torrent by link with deluge"""
+    if update.effective_user is None:
+        logger.error("Effective user doesn't exist")
+        return
+
+    if update.effective_message is None or update.message is None:
+        logger.error("Effective message doesn't exist")
+        return
+
+    if update.effective_message.text is None or update.message.text is None:
+        logger.error("Effective message text doesn't exist")
+        return
+
+    command_entity = update.effective_message.entities[0]
+    if command_entity.type != MessageEntity.BOT_COMMAND:
+        logger.error("Message without command is not allowed")
+        return
+
+    text = urllib.parse.unquote(update.effective_message.text)
+    link = text[command_entity.length + 1 :]
+
+    torrent_urls = [link]
+    # TODO:
+    # for entity in update.effective_message.entities:
+    #   print(entity)
+    #   if entity.type == MessageEntity.URL or entity.type == MessageEntity.TEXT_LINK:
+    #     entity_text = update.message.text[entity.offset : entity.offset + entity.length]
+    #     print(entity_text)
+    #     torrent_urls.append(entity_text)
+
+    logger.info("Add %s torrents", len(torrent_urls))
+
+    for torrent_url in torrent_urls:
+        torrent_name = torrent_url
+
+        try:
+            if torrent_url.startswith("magnet"):
+                torrent_name = parse_magnet_link(torrent_url).get("dn", torrent_url)
+                infohash = infohash_from_magnet(torrent_url)
+
+                existing = await __find_existing(index, infohash)
+                if existing is not None:
+                    await update.effective_message.reply_text(
+                        f"{TORRENT_EXISTS_MSG}: {existing}"
+                    )
+                    continue
+
+                logger.info("Add magnet-link torrent: %s", torrent_url)
+                infohash = await deluge.acall(
+                    "core.add_torrent_magnet", torrent_url, ADD_OPTIONS
+                )
+            else:
+                # The infohash of a remote .torrent is known only after Deluge fetches it
+                logger.info("Add link torrent: %s", torrent_url)
+                infohash = await deluge.acall(
+                    "core.add_torrent_url", torrent_url, ADD_OPTIONS
+                )
+        except Exception as e:
+            logger.error("Unable to add torrent %s: %s", torrent_name, e)
+            await update.effective_message.reply_text(
+                f"{UNABLE_ADD_TORRENT_MSG} {torrent_name}"
+            )
+            continue
+
+        if infohash:
+            index.add(infohash, torrent_name)
+
+        await update.effective_message.reply_text(f"Торрент {torrent_name} добавлен")
+
+
+async def download_torrent_by_file(
+    update: Update,
+    context: ContextTypes.DEFAULT_TYPE,
+    deluge: DelugeConnection,
+    index: TorrentIndex,
+):
+    """Download torrent by file with deluge"""
+    if update.effective_user is None:
+        logger.error("Effective user doesn't exist")
+        return
+
+    if update.effective_message is None:
+        logger.error("Effective message doesn't exist")
+        return
+
+    doc = update.effective_message.document
+    if doc is None:
+        await update.effective_message.reply_text(TORRENT_FILE_NOT_FOUND_MSG)
+        return
+
+    logger.info("Got document: %s", doc.file_name)
+
+    try:
+        file = await context.bot.get_file(doc)
+        file_content = bytes(await file.download_as_bytearray())
+        infohash = infohash_from_torrent(file_content)
+    except Exception as e:
+        logger.error("Unable to process torrent file %s: %s", doc.file_name, e)
+        await update.effective_message.reply_text(UNABLE_PARSE_TORRENT_FILE_MSG)
+        return
+
+    existing = await __find_existing(index, infohash)
+    if existing is not None:
+        await update.effective_message.reply_text(f"{TORRENT_EXISTS_MSG}: {existing}")
+        return
+
+    try:
+        logger.info("Add torrent file: %s", doc.file_name)
+        await deluge.acall(
+            "core.add_torrent_file",
+            doc.file_name,
+            b64encode(file_content).decode("ascii"),
+            ADD_OPTIONS,
+        )
+    except Exception as e:
+        logger.error("Unable to add torrent %s: %s", doc.file_name, e)
+        await update.effective_message.reply_text(
+            f"{UNABLE_ADD_TORRENT_MSG} {doc.file_name}"
+        )
+        return
+
+    index.add(infohash, doc.file_name or infohash)
+    await update.effective_message.reply_text(f"Торрент {doc.file_name} добавлен")
+
+
+async def list_torrents(
+    update: Update, context: ContextTypes.DEFAULT_TYPE, index: TorrentIndex
+):
+    """List torrents with statuses"""
+    if update.effective_user is None:
+        logger.error("Effective user doesn't exist")
+        return
+
+    if update.effective_message is None:
+        logger.error("Effective message doesn't exist")
+        return
+
+    try:
+        # Listing wants the current state and refreshes the index on the way
+        await index.refresh(force=True)
+    except Exception as e:
+        logger.error("Unable to list torrents: %s", e)
+        await update.effective_message.reply_text(UNABLE_LIST_TORRENTS_MSG)
+        return
+
+    torrents = index.all()
+    if not torrents:
+        await update.effective_message.reply_text(NO_TORRENTS_FOUND_MSG)
+        return
+
+    await update.effective_message.reply_text("\n".join(str(t) for t in torrents))
+
+
+async def find_torrents(
+    update: Update, context: ContextTypes.DEFAULT_TYPE, index: TorrentIndex
+):
+    """Find torrents by a name substring in the cached index"""
+    assert update.effective_message is not None
+
+    substring = " ".join(context.args or []).strip()
+    if not substring:
+        await update.effective_message.reply_text("Usage: /find <substring>")
+        return
+
+    try:
+        await index.refresh()
+    except Exception as e:
+        # A stale index is still better than nothing
+        logger.warning("Unable to refresh torrent index: %s", e)
+
+    torrents = index.find(substring)
+    if not torrents:
+        await update.effective_message.reply_text(NO_TORRENTS_FOUND_MSG)
+        return
+
+    reply = "\n".join(str(t) for t in torrents[:MAX_FIND_RESULTS])
+    if len(torrents) > MAX_FIND_RESULTS:
+        reply += f"\n... и ещё {len(torrents) - MAX_FIND_RESULTS}"
+
+    await update.effective_message.reply_text(reply)
+
+
+async def __find_existing(
+    index: TorrentIndex, infohash: Optional[str]
+) -> Optional[TorrentInfo]:
+    if infohash is None:
+        return None
+
+    try:
+        await index.refresh()
+    except Exception as e:
+        # Deluge rejects duplicates itself, the index only answers faster
+        logger.warning("Unable to refresh torrent index: %s", e)
+
+    return index.get(infohash)
@@ -0,0 +1,187 @@
+import time
+import base64
+import hashlib
+import urllib.parse
+
+import asyncio
+
+from typing import TYPE_CHECKING, Any, Dict, List, Optional
+
+if TYPE_CHECKING:
+    from torrent.client import DelugeConnection
+
+STATUS_FIELDS = ["name", "state", "progress", "ratio", "save_path"]
+
+
+class TorrentInfo(object):
+    def __init__(
+        self,
+        infohash: str,
+        name: str,
+        state: str,
+        progress: float,
+        ratio: float = 0.0,
+        save_path: str = "",
+    ):
+        self.infohash = infohash
+        self.name = name
+        self.state = state
+        self.progress = progress
+        self.ratio = ratio
+        self.save_path = save_path
+
+    def __str__(self) -> str:
+        return f"{self.name} -> {self.state} [{self.progress:.2f} %]"
+
+
+class TorrentIndex(object):
+    """In-memory index of Deluge torrents by infohash.
+
+    Fed from a cached `core.get_torrents_status` snapshot which is refreshed at
+    most once per `ttl` seconds, and from torrents added through the bot.
+    """
+
+    def __init__(self, deluge: "DelugeConnection", ttl: float):
+        self.deluge = deluge
+        self.ttl = ttl
+        self.torrents: Dict[str, TorrentInfo] = {}
+        self._refreshed_at: Optional[float] = None
+        self._lock = asyncio.Lock()
+
+    async def refresh(self, force: bool = False):
+        async with self._lock:
+            if (
+                not force
+                and self._refreshed_at is not None
+                and time.monotonic() - self._refreshed_at < self.ttl
+            ):
+                return
+
+            status = await self.deluge.acall(
+                "core.get_torrents_status", {}, STATUS_FIELDS
+            )
+            self.torrents = {
+                infohash.lower(): _info(infohash, fields)
+                for infohash, fields in status.items()
+            }
+            self._refreshed_at = time.monotonic()
+
+    def get(self, infohash: str) -> Optional[TorrentInfo]:
+        return self.torrents.get(infohash.lower())
+
+    def add(self, infohash: str, name: str):
+        """Remember a torrent added by the bot until the next refresh sees it"""
+        self.torrents[infohash.lower()] = TorrentInfo(
+            infohash.lower(), name, "Queued", 0.0
+        )
+
+    def discard(self, infohashes: List[str]):
+        for infohash in infohashes:
+            self.torrents.pop(infohash.lower(), None)
+
+    def invalidate(self):
+        """Make the next refresh fetch a new snapshot"""
+        self._refreshed_at = None
+
+    def find(self, substring: str) -> List[TorrentInfo]:
+        needle = substring.casefold()
+        return [t for t in self.torrents.values() if needle in t.name.casefold()]
+
+    def all(self) -> List[TorrentInfo]:
+        return list(self.torrents.values())
+
+
+def parse_magnet_link(magnet_link):
+    """
+    Parses a magnet link and extracts its components.
+
+    Args:
+        magnet_link (str): The magnet link string.
+
+    Returns:
+        dict: A dictionary containing the parsed components.
+              Keys include 'xt', 'dn', 'tr', etc.
+    """
+    parsed_url = urllib.parse.urlparse(magnet_link)
+    query_params = urllib.parse.parse_qs(parsed_url.query)
+
+    # Convert lists of single values to single values
+    parsed_components = {
+        key: value[0] if len(value) == 1 else value
+        for key, value in query_params.items()
+    }
+    return parsed_components
+
+
+def infohash_from_magnet(magnet_link: str) -> Optional[str]:
+    """Return the hex v1 infohash of a magnet link or None if it has no one"""
+    xt = parse_magnet_link(magnet_link).get("xt", [])
+    for topic in xt if isinstance(xt, list) else [xt]:
+        prefix, _sep, value = topic.rpartition(":")
+        if prefix.lower() != "urn:btih":
+            continue
+
+        if len(value) == 40:
+            return value.lower()
+        if len(value) == 32:
+            return base64.b32decode(value.upper()).hex()
+
+    return None
+
+
+def infohash_from_torrent(data: bytes) -> str:
+    """Return the hex v1 infohash (sha1 of the bencoded info dict) of a .torrent"""
+    try:
+        if data[:1] != b"d":
+            raise ValueError("Torrent is not a bencoded dictionary")
+
+        pos = 1
+        while data[pos : pos + 1] != b"e":
+            key_start = data.index(b":", pos) + 1
+            key_end = _skip(data, pos)
+            value_end = _skip(data, key_end)
+
+            if data[key_start:key_end] == b"info":
+                return hashlib.sha1(data[key_end:value_end]).hexdigest()
+
+            pos = value_end
+    except (IndexError, ValueError) as e:
+        raise ValueError(f"Malformed torrent file: {e}") from e
+
+    raise ValueError("Malformed torrent file: no info dictionary")
+
+
+def _skip(data: bytes, pos: int) -> int:
+    """Return the end of the bencoded value starting at `pos`"""
+    token = data[pos : pos + 1]
+
+    if token == b"i":
+        return data.index(b"e", pos) + 1
+
+    if token in (b"l", b"d"):
+        pos += 1
+        while data[pos : pos + 1] != b"e":
+            if pos >= len(data):
+                raise ValueError("Unterminated container")
+            pos = _skip(data, pos)
+        return pos + 1
+
+    if token.isdigit():
+        colon = data.index(b":", pos)
+        end = colon + 1 + int(data[pos:colon])
+        if end > len(data):
+            raise ValueError("String is out of bounds")
+        return end
+
+    raise ValueError(f"Unexpected token {token!r} at {pos}")
+
+
+def _info(infohash: str, fields: Dict[str, Any]) -> TorrentInfo:
+    return TorrentInfo(
+        infohash.lower(),
+        fields.get("name", ""),
+        fields.get("state", ""),
+        fields.get("progress", 0.0),
+        fields.get("ratio", 0.0),
+        fields.get("save_path", ""),
+    )
@@ -0,0 +1,168 @@
+import re
+import fnmatch
+import operator
+
+from typing import Callable, List
+
+from torrent.index import TorrentInfo
+
+STATES = {
+    "allocating",
+    "checking",
+    "downloading",
+    "error",
+    "moving",
+    "paused",
+    "queued",
+    "seeding",
+}
+FIELDS = {"ratio", "progress"}
+OPERATORS: dict = {
+    ">": operator.gt,
+    ">=": operator.ge,
+    "<": operator.lt,
+    "<=": operator.le,
+    "=": operator.eq,
+}
+
+_COMPARISON = re.compile(
+    r"^(?:(?P<field>[a-z]+)\s*(?P<op>[<>]=?|=)\s*(?P<value>\d+(?:[.,]\d+)?)"
+    r"|(?P<op2>[<>]=?|=)\s*(?P<value2>\d+(?:[.,]\d+)?)\s*(?P<field2>[a-z]+))$"
+)
+_INFOHASH_PREFIX = re.compile(r"^[0-9a-f]{6,40}$")
+_ID_MARKERS = ("#", "id:")
+
+
+class SelectorError(ValueError):
+    pass
+
+
+class Selector(object):
+    """Selects torrents by ids, name patterns and state filters.
+
+    Ids and patterns are alternatives, filters must all hold:
+        all seeding ratio > 2.0
+        ubuntu* debian* paused
+        #3f2a9c id:77b01e facade
+        the matrix
+    Ids are infohash prefixes of at least 6 characters. Patterns are globs or
+    substrings of the name, case insensitive, and consecutive plain words make
+    a single substring, so "the matrix" doesn't select "The Office". Spaces,
+    dots, dashes and underscores in names are treated alike. A bare hex word
+    like "facade" is an id if some infohash starts with it and a name pattern
+    otherwise, `#` or `id:` makes it an id anyway.
+    """
+
+    def __init__(self):
+        self.select_all = False
+        self.ids: List[str] = []
+        self.hex_words: List[str] = []
+        self.patterns: List[str] = []
+        self.filters: List[Callable[[TorrentInfo], bool]] = []
+
+    def __bool__(self) -> bool:
+        return self.select_all or bool(
+            self.ids or self.hex_words or self.patterns or self.filters
+        )
+
+    def select(self, torrents: List[TorrentInfo]) -> List[TorrentInfo]:
+        ids, patterns = list(self.ids), list(self.patterns)
+        for word in self.hex_words:
+            if any(t.infohash.startswith(word) for t in torrents):
+                ids.append(word)
+            else:
+                patterns.append(f"*{word}*")
+
+        return [t for t in torrents if self._match(t, ids, patterns)]
+
+    def _match(
+        self, torrent: TorrentInfo, ids: List[str], patterns: List[str]
+    ) -> bool:
+        if not all(f(torrent) for f in self.filters):
+            return False
+
+        if not (ids or patterns):
+            return True
+
+        name = torrent.name.casefold()
+        words = _normalize(name)
+        return any(torrent.infohash.startswith(i) for i in ids) or any(
+            fnmatch.fnmatchcase(name, p) or fnmatch.fnmatchcase(words, p)
+            for p in patterns
+        )
+
+
+def parse_selector(args: List[str]) -> Selector:
+    selector = Selector()
+    phrase: List[str] = []
+
+    def flush():
+        if len(phrase) == 1 and _INFOHASH_PREFIX.match(phrase[0]):
+            selector.hex_words.append(phrase[0])
+        elif phrase:
+            selector.patterns.append(f"*{_normalize(' '.join(phrase))}*")
+        phrase.clear()
+
+    # Comparisons may be split by spaces: "ratio > 2.0" or "> 2.0 ratio"
+    tokens = re.findall(r"[<>]=?|=|[^\s<>=]+", " ".join(args))
+    pos = 0
+    while pos < len(tokens):
+        token = tokens[pos]
+        word = token.casefold()
+
+        comparison = _parse_comparison(tokens[pos : pos + 3])
+        if comparison is not None:
+            flush()
+            selector.filters.append(comparison)
+            pos += 3
+            continue
+
+        if word in FIELDS or word in OPERATORS:
+            raise SelectorError(f"Incomplete comparison near '{token}'")
+
+        if word == "all":
+            flush()
+            selector.select_all = True
+        elif word in STATES:
+            flush()
+            selector.filters.append(lambda t, state=word: t.state.casefold() == state)
+        elif word.startswith(_ID_MARKERS):
+            flush()
+            infohash = word.removeprefix("#").removeprefix("id:")
+            if not _INFOHASH_PREFIX.match(infohash):
+                raise SelectorError(f"Invalid torrent id '{token}'")
+            selector.ids.append(infohash)
+        elif any(c in word for c in "*?["):
+            flush()
+            selector.patterns.append(word)
+        else:
+            phrase.append(word)
+
+        pos += 1
+
+    flush()
+
+    if not selector:
+        raise SelectorError("Torrents are not specified")
+
+    return selector
+
+
+def _normalize(name: str) -> str:
+    return re.sub(r"[\s._-]+", " ", name).strip()
+
+
+def _parse_comparison(tokens: List[str]):
+    m = _COMPARISON.match(" ".join(tokens).casefold())
+    if m is None:
+        return None
+
+    field = m.group("field") or m.group("field2")
+    if field not in FIELDS:
+        # "seeding > 2.0 ratio" is a state followed by a reversed comparison
+        return None
+
+    op = OPERATORS[m.group("op") or m.group("op2")]
+    value = float((m.group("value") or m.group("value2")).replace(",", "."))
+
+    return lambda t: op(getattr(t, field), value)
@@ -0,0 +1,21 @@
+from bson import ObjectId
+
+from typing import Dict, Iterable, Optional
+
+from db import get_database
+from user.model import User
+
+
+def __collection():
+    return get_database()[User._get_collection_name()]
+
+
+async def get(user_id: int) -> Optional[User]:
+    doc = await __collection().find_one({"user_id": user_id})
+    return User._from_son(doc) if doc is not None else None
+
+
+async def get_many(ids: Iterable[ObjectId]) -> Dict[ObjectId, User]:
+    """Fetch users by their document ids with a single query"""
+    cursor = __collection().find({"_id": {"$in": list(ids)}})
+    return {doc["_id"]: User._from_son(doc) async for doc in cursor}